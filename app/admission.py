@@ -0,0 +1,147 @@
+"""Admission control: bounded concurrency and queue in front of inference."""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import logging
+import time
+from typing import AsyncIterator, Deque, Dict, Optional, Text
+
+
+logger = logging.getLogger('ADMISSION')
+
+
+class Overloaded(Exception):
+    """The request was shed; ``reason`` is 'queue_full' or 'timeout'."""
+
+    def __init__(self, reason: Text) -> None:
+        super().__init__(f'Server overloaded ({reason}), retry later')
+        self.reason = reason
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded FIFO queue and an adaptive limit.
+
+    At most ``limit`` requests run inference at once. Extra requests wait
+    in a queue of at most ``max_queue`` entries for at most ``queue_timeout``
+    seconds; beyond that they are rejected immediately with ``Overloaded``
+    instead of piling up and dragging every request's latency with them.
+
+    The limit adapts to observed latency (AIMD): every sample under
+    ``target_latency`` grows it by ``1 / limit`` (about +1 per limit's worth
+    of requests), and a sample above it shrinks it by ``backoff``, at most
+    once per ``target_latency`` so one slow burst does not collapse it. It
+    stays within [``min_concurrency``, ``max_concurrency``].
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float = 1.0,
+                 min_concurrency: int = 1, target_latency: Optional[float] = None,
+                 backoff: float = 0.9) -> None:
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+        # Metrics
+        self.admitted = 0
+        self.shed: Dict[Text, int] = {'queue_full': 0, 'timeout': 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def effective_limit(self) -> int:
+        return max(self.min_concurrency, int(self.limit))
+
+    async def acquire(self) -> None:
+        """Take an inference slot, waiting in the queue if needed.
+        Raises:
+            Overloaded: the queue is full or the wait exceeded queue_timeout
+        """
+
+        if self.in_flight < self.effective_limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.shed['queue_full'] += 1
+            raise Overloaded('queue_full')
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            # shield: a timeout must not cancel a slot granted at the same moment
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._waiters.remove(future)
+                self.shed['timeout'] += 1
+                raise Overloaded('timeout')
+        except asyncio.CancelledError:
+            # Client went away: give the slot back if it was already granted
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+                self._waiters.remove(future)
+            raise
+        self.admitted += 1
+
+    def release(self, latency: Optional[float] = None) -> None:
+        """Free a slot and hand it to the next queued request.
+        Args:
+            latency {float}: inference latency of the request, fed to the limit;
+                None for requests that should not steer it (e.g. large batches)
+        """
+
+        self.in_flight -= 1
+        if latency is not None:
+            self._adapt(latency)
+
+        while self._waiters and self.in_flight < self.effective_limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, adapt: bool = True) -> AsyncIterator[None]:
+        """Hold an inference slot for the enclosed block."""
+
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start if adapt else None)
+
+    def _adapt(self, latency: float) -> None:
+        if self.target_latency is None:
+            return
+        if latency <= self.target_latency:
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            return
+
+        now = time.monotonic()
+        if now - self._last_decrease >= self.target_latency:
+            self._last_decrease = now
+            self.limit = max(float(self.min_concurrency), self.limit * self.backoff)
+            logger.debug(f'Latency {latency * 1000:.1f} ms over target, limit now {self.limit:.1f}')
+
+    def stats(self) -> Dict:
+        return {
+            'limit': self.effective_limit,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'admitted': self.admitted,
+            'shed': dict(self.shed),
+        }
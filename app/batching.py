@@ -0,0 +1,178 @@
+"""Coalesces concurrent single-row predictions into vectorized batches."""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger('MICRO_BATCHER')
+
+# Upper bounds of the batch size histogram
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class MicroBatcher:
+    """Async request coalescer in front of a vectorized predict function.
+
+    Requests are queued with a future each. A single worker task takes the
+    first waiting row, drains whatever else is already queued and, when the
+    service is under concurrent load, keeps collecting for at most
+    ``max_wait`` seconds or until ``max_batch_size`` rows. The batch is
+    predicted once in the default executor, so sklearn never runs on the
+    event loop, and the results are fanned back out to the waiting futures.
+
+    The wait is adaptive: a lone request (previous batch had one row and the
+    queue is empty) is dispatched immediately instead of paying ``max_wait``.
+
+    When a batch fails its rows are predicted one by one, so only the request
+    carrying the offending row gets the error.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 64, max_wait: float = 0.002) -> None:
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._last_batch_size = 1
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self.queue_delay_sum = 0.0
+        self.queue_delay_max = 0.0
+
+    async def start(self) -> None:
+        """Start the worker task on the running event loop."""
+
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            loop = asyncio.get_running_loop()
+            self._worker = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the worker task."""
+
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        # Do not leave callers waiting on a batch that will never run
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            future.cancel()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, row: Sequence[float]) -> float:
+        """Queue one feature row and wait for its prediction."""
+
+        if self._queue is None:
+            raise RuntimeError('MicroBatcher is not started')
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future, time.perf_counter()))
+        return await future
+
+    def stats(self) -> Dict:
+        """Get batch size and queue delay metrics."""
+
+        bounds = [str(b) for b in BATCH_SIZE_BUCKETS] + ['+Inf']
+        items = self.items or 1
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / (self.batches or 1),
+            'batch_size_buckets': dict(zip(bounds, self.batch_size_counts)),
+            'mean_queue_delay_ms': 1000 * self.queue_delay_sum / items,
+            'max_queue_delay_ms': 1000 * self.queue_delay_max,
+            'queue_depth': self.queue_depth,
+        }
+
+    async def _collect(self) -> List[Tuple]:
+        batch = [await self._queue.get()]
+        adaptive_wait = self._last_batch_size > 1 or not self._queue.empty()
+        wait = self.max_wait if adaptive_wait else 0.0
+        deadline = time.perf_counter() + wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(),
+                                                    timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    def _record(self, batch: List[Tuple], dispatched_at: float) -> None:
+        size = len(batch)
+        self._last_batch_size = size
+        self.batches += 1
+        self.items += size
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS)
+                       if size <= bound), len(BATCH_SIZE_BUCKETS))
+        self.batch_size_counts[bucket] += 1
+        for _, _, enqueued_at in batch:
+            delay = dispatched_at - enqueued_at
+            self.queue_delay_sum += delay
+            self.queue_delay_max = max(self.queue_delay_max, delay)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Requests whose client went away are not worth predicting
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            self._record(batch, time.perf_counter())
+            X = np.array([row for row, _, _ in batch], dtype=np.float64)
+            try:
+                predictions = await loop.run_in_executor(None,
+                                                         self.predict_fn, X)
+            except Exception as e:
+                if len(batch) == 1:
+                    logger.exception('Prediction failed')
+                    predictions = [e]
+                else:
+                    logger.exception(
+                        'Batch prediction failed, retrying row by row')
+                    predictions = await loop.run_in_executor(
+                        None, self._predict_rows, X)
+
+            for (_, future, _), prediction in zip(batch, predictions):
+                if future.done():
+                    continue
+                if isinstance(prediction, Exception):
+                    future.set_exception(prediction)
+                else:
+                    future.set_result(float(prediction))
+
+    def _predict_rows(self, X: np.ndarray) -> List:
+        # One predict call per row: a prediction, or the exception of that
+        # row alone
+        results = []
+        for i in range(X.shape[0]):
+            try:
+                results.append(self.predict_fn(X[i:i + 1])[0])
+            except Exception as e:
+                results.append(e)
+        return results
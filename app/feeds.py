@@ -0,0 +1,105 @@
+"""Long-lived WebSocket sessions scoring a continuous feed of readings."""
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+
+logger = logging.getLogger('FEEDS')
+
+# Close code sent to a client that stops reading its predictions (RFC 6455: try again later)
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class FeedSession:
+    """Receive, score and answer the messages of one WebSocket connection.
+
+    Incoming messages are moved into a queue of at most ``max_pending``
+    entries and a scorer task answers them in order. When a client sends
+    faster than it is scored, the full queue stops the reading, so the rest
+    stays in the socket buffers and TCP flow control slows the client
+    down. When a client stops reading, a send that does not complete within
+    ``send_timeout`` seconds closes the connection. Either way the memory
+    held per connection stays bounded.
+    """
+
+    def __init__(self, websocket: WebSocket, handle: Callable[[Any], Awaitable[Dict]],
+                 max_pending: int = 32, send_timeout: float = 10.0) -> None:
+        self.websocket = websocket
+        self.handle = handle
+        self.send_timeout = send_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.received = 0
+        self.sent = 0
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def run(self) -> None:
+        """Serve the connection until the client leaves or is dropped."""
+
+        # Reading happens in the connection's own task, so a disconnect ends it right away
+        scorer = asyncio.ensure_future(self._score())
+        try:
+            while not scorer.done():
+                try:
+                    text = await self.websocket.receive_text()
+                except KeyError:
+                    # A binary frame has no text; it is answered with an error, in order
+                    text = None
+                self.received += 1
+                await self._queue.put(text)
+        except (WebSocketDisconnect, RuntimeError):
+            # RuntimeError: the scorer already closed the connection
+            pass
+        finally:
+            scorer.cancel()
+
+    async def _score(self) -> None:
+        try:
+            await self._score_messages()
+        finally:
+            # Unblock a reader waiting for room in the queue
+            while not self._queue.empty():
+                self._queue.get_nowait()
+
+    async def _score_messages(self) -> None:
+        while True:
+            text = await self._queue.get()
+            if text is None:
+                reply = {'error': 'Expected a JSON text frame, got a binary one'}
+            else:
+                reply = await self._reply(text)
+
+            try:
+                await asyncio.wait_for(self.websocket.send_text(json.dumps(reply)), self.send_timeout)
+            except asyncio.TimeoutError:
+                logger.warning('Client not reading its predictions, closing the connection')
+                await self._close(CLOSE_TRY_AGAIN_LATER)
+                return
+            except (WebSocketDisconnect, RuntimeError):
+                return
+            self.sent += 1
+
+    async def _reply(self, text: str) -> Dict:
+        try:
+            message = json.loads(text)
+        except ValueError as e:
+            return {'error': f'Invalid JSON: {e}'}
+        return await self.handle(message)
+
+    async def _close(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except RuntimeError:
+            pass
+
+
+def message_id(message: Any) -> Optional[Any]:
+    """Get the client correlation id of a message, echoed back in the reply."""
+
+    return message.get('id') if isinstance(message, dict) else None
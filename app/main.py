@@ -1,12 +1,321 @@
 # main.py
 
-from fastapi import FastAPI, HTTPException
+import time
+STARTUP_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager, nullcontext
+from functools import partial
+import json
+import os
+import sys
+import tempfile
+from typing import List, Optional, Tuple
+import warnings
+
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import uvicorn
-import joblib
-import pandas as pd
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection
+import numpy as np
+
+# Make the sibling serving modules and the shared src utilities importable
+# whatever the working directory
+app_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(app_dir)
+sys.path.append(os.path.join(os.path.dirname(app_dir), 'src'))
+
+from admission import AdmissionController, Overloaded
+from batching import MicroBatcher
+from feeds import FeedSession, message_id
+from metrics import Counter, Gauge, Histogram, MetricsMiddleware, Registry
+from model_holder import LoadedModel, ModelHolder
+from model_registry import ModelRegistry, parse_versions
+from payloads import BINARY_CONTENT_TYPES, decode_features, encode_predictions
+from prediction_cache import PredictionCache
+from streaming import StreamFormatError, csv_parser, iter_file, iter_lines, iter_row_chunks, \
+    ndjson_parser, spooled_output
+from utils.forest import CompiledForest
+from utils.logs import get_logger
+from utils.transforms import FeatureTransform
+from workers import InferencePool
+
+
+# Serving settings, overridable from the container environment
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join(app_dir, 'model.joblib'))
+TRANSFORM_PATH = os.environ.get('TRANSFORM_PATH', os.path.join(os.path.dirname(MODEL_PATH), 'transform.json'))
+# The model is trained on Box-Cox + min-max features: refuse to serve it without
+# its transform (REQUIRE_TRANSFORM=0 only logs a warning)
+REQUIRE_TRANSFORM = os.environ.get('REQUIRE_TRANSFORM', '1') == '1'
+# A .npz MODEL_PATH is the compact forest written by src/stages/export.py, served without sklearn
+MODEL_POLL_INTERVAL = float(os.environ.get('MODEL_POLL_INTERVAL', '5'))
+# Extra versions served side by side: name=path[:weight],... (weight 0: only via X-Model-Version)
+MODEL_NAME = os.environ.get('MODEL_NAME', 'main')
+MODEL_WEIGHT = float(os.environ.get('MODEL_WEIGHT', '1'))
+MODEL_VERSIONS = parse_versions(os.environ.get('MODEL_VERSIONS', ''))
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', '1024'))
+MAX_BATCH_ROWS = int(os.environ.get('MAX_BATCH_ROWS', '100000'))
+MAX_BATCH_CHUNK = int(os.environ.get('MAX_BATCH_CHUNK', '4096'))
+USE_COMPILED_FOREST = os.environ.get('USE_COMPILED_FOREST', '1') == '1'
+COMPILED_FOREST_MAX_ROWS = int(os.environ.get('COMPILED_FOREST_MAX_ROWS', '512'))
+INFERENCE_PROCESSES = int(os.environ.get('INFERENCE_PROCESSES', '0'))
+MODEL_MMAP_DIR = os.environ.get('MODEL_MMAP_DIR', os.path.join(tempfile.gettempdir(), 'airquality-model'))
+WARMUP_BATCH_SIZES = [int(n) for n in os.environ.get('WARMUP_BATCH_SIZES', '1,64,1024').split(',') if n]
+# Optional representative readings for the warmup: .npy matrix in Item order, or CSV with a header
+WARMUP_DATA = os.environ.get('WARMUP_DATA')
+MICROBATCH_ENABLED = os.environ.get('MICROBATCH_ENABLED', '1') == '1'
+MICROBATCH_MAX_SIZE = int(os.environ.get('MICROBATCH_MAX_SIZE', '64'))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('MICROBATCH_MAX_WAIT_MS', '2'))
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', '1024'))
+STREAM_SPOOL_BYTES = int(os.environ.get('STREAM_SPOOL_BYTES', str(8 * 1024 * 1024)))
+# A longer streamed line is refused with 422 instead of being buffered
+STREAM_MAX_LINE_BYTES = int(os.environ.get('STREAM_MAX_LINE_BYTES', str(64 * 1024)))
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '0'))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', '0')) or None
+PREDICTION_CACHE_DECIMALS = os.environ.get('PREDICTION_CACHE_DECIMALS')
+WS_MAX_PENDING = int(os.environ.get('WS_MAX_PENDING', '32'))
+WS_MAX_BATCH_ROWS = int(os.environ.get('WS_MAX_BATCH_ROWS', '1000'))
+WS_SEND_TIMEOUT = float(os.environ.get('WS_SEND_TIMEOUT', '10'))
+# Admission control in front of inference; ADMISSION_MAX_CONCURRENCY=0 disables it
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get('ADMISSION_MAX_CONCURRENCY', '64'))
+ADMISSION_MIN_CONCURRENCY = int(os.environ.get('ADMISSION_MIN_CONCURRENCY', '4'))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '128'))
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS', '1000'))
+ADMISSION_TARGET_LATENCY_MS = float(os.environ.get('ADMISSION_TARGET_LATENCY_MS', '100'))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', '1'))
+
+# Batch paths feed plain NumPy matrices in the training column order
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+logger = get_logger('API', log_level=LOG_LEVEL)
+
+# Seconds spent in each cold start phase, filled in while starting up
+startup_report = {}
+
+# Process-pool mode: the model arrays are dumped once and memory-mapped by every worker
+inference_pool = None
+if INFERENCE_PROCESSES > 0:
+    # Keep the dumps of every registered version plus the one being swapped in
+    inference_pool = InferencePool(INFERENCE_PROCESSES, MODEL_MMAP_DIR, keep_versions=len(MODEL_VERSIONS) + 2)
+    build_engine = inference_pool.build_engine
+elif USE_COMPILED_FOREST:
+    build_engine = CompiledForest.from_sklearn
+else:
+    build_engine = None
+
+
+def load_transform(path: str) -> FeatureTransform:
+    """Load the feature transform artifact and check it matches the Item schema."""
+
+    transform = FeatureTransform.load(path)
+    if transform.features != FEATURES:
+        raise ValueError(f'Transform features {transform.features} do not match {FEATURES}')
+    return transform
+
+
+def make_holder(path: str, transform_path: str, poll_interval: float) -> ModelHolder:
+    """Build the holder of one model file, joblib pickle or compact .npz forest."""
+
+    compact = path.endswith('.npz')
+    return ModelHolder(path, poll_interval=poll_interval,
+                       build_engine=None if compact and inference_pool is None else build_engine,
+                       transform_path=transform_path, load_transform=load_transform,
+                       load_model=CompiledForest.load_npz if compact else None,
+                       require_transform=REQUIRE_TRANSFORM)
+
+
+model_holder = make_holder(MODEL_PATH, TRANSFORM_PATH, MODEL_POLL_INTERVAL)
+
+# The main model is pinned and hot-swapped by its watcher; other versions load on first use
+model_registry = ModelRegistry(memory_budget=int(MODEL_MEMORY_BUDGET_MB * 1024 * 1024))
+model_registry.add(MODEL_NAME, model_holder, weight=MODEL_WEIGHT, pinned=True)
+for name, path, weight in MODEL_VERSIONS:
+    model_registry.add(name, make_holder(path, os.path.join(os.path.dirname(path), 'transform.json'), 0),
+                       weight=weight)
+if MODEL_WEIGHT <= 0 and not any(weight > 0 for _, _, weight in MODEL_VERSIONS):
+    raise ValueError('At least one model version needs a positive weight')
+
+
+def predict_current(X: np.ndarray) -> np.ndarray:
+    """Predict a feature matrix with the current model snapshot."""
+
+    return predict_matrix(model_holder.current, X)
+
+
+micro_batcher = MicroBatcher(predict_current, max_batch_size=MICROBATCH_MAX_SIZE,
+                             max_wait=MICROBATCH_MAX_WAIT_MS / 1000)
+
+# Optional: disabled unless PREDICTION_CACHE_SIZE > 0; emptied on every model swap
+prediction_cache = None
+if PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(
+        max_size=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL,
+        decimals=int(PREDICTION_CACHE_DECIMALS) if PREDICTION_CACHE_DECIMALS else None)
+    model_holder.add_listener(prediction_cache.clear)
+
+# Optional: bounded concurrency and queue, the limit adapting to /predict inference latency
+admission = None
+if ADMISSION_MAX_CONCURRENCY > 0:
+    admission = AdmissionController(
+        max_concurrency=ADMISSION_MAX_CONCURRENCY, max_queue=ADMISSION_MAX_QUEUE,
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT_MS / 1000, min_concurrency=ADMISSION_MIN_CONCURRENCY,
+        target_latency=ADMISSION_TARGET_LATENCY_MS / 1000 if ADMISSION_TARGET_LATENCY_MS > 0 else None)
+
+
+# Open WebSocket feed sessions, for the connection and backlog gauges
+feed_sessions = set()
+
+
+def admitted(adapt: bool = True):
+    """Hold an admission slot around inference, when admission control is on."""
+
+    return admission.slot(adapt) if admission is not None else nullcontext()
+
+
+# Metrics exposed on /metrics
+registry = Registry()
+request_latency = registry.register(Histogram(
+    'http_request_duration_seconds', 'End-to-end request latency', labels=['path']))
+requests_total = registry.register(Counter(
+    'http_requests_total', 'Requests by route and status code', labels=['path', 'status']))
+errors_total = registry.register(Counter(
+    'http_request_errors_total', 'Requests answered with a 5xx status', labels=['path']))
+stage_latency = registry.register(Histogram(
+    'prediction_stage_duration_seconds', 'Latency of each request phase',
+    labels=['endpoint', 'stage']))
+predict_latency = registry.register(Histogram(
+    'model_predict_duration_seconds', 'Latency of one predict call', labels=['engine']))
+predicted_rows = registry.register(Counter(
+    'model_predicted_rows_total', 'Rows scored by the model', labels=['engine']))
+version_latency = registry.register(Histogram(
+    'model_version_predict_duration_seconds', 'Prediction latency by model version', labels=['version']))
+version_predictions = registry.register(Counter(
+    'model_version_predictions_total', 'Rows predicted by model version', labels=['version']))
+registry.register(Gauge(
+    'model_version_memory_bytes', 'Estimated memory of each loaded model version', labels=['version'],
+    callback=lambda: {(name,): info['nbytes'] for name, info in model_registry.stats()['versions'].items()
+                      if info['nbytes'] is not None}))
+registry.register(Gauge(
+    'model_info', 'Currently served model version', labels=['version'],
+    callback=lambda: {(model_holder.current.version,): 1} if model_holder.loaded else {}))
+registry.register(Gauge(
+    'startup_duration_seconds', 'Cold start time by phase', labels=['phase'],
+    callback=lambda: {(phase,): seconds for phase, seconds in startup_report.items()}))
+registry.register(Gauge(
+    'microbatch_queue_depth', 'Requests waiting for the micro-batcher',
+    callback=lambda: {(): micro_batcher.queue_depth}))
+registry.register(Counter(
+    'microbatch_batches_total', 'Micro-batches dispatched, by upper bound of their size', labels=['le'],
+    callback=lambda: {(le,): n for le, n in micro_batcher.stats()['batch_size_buckets'].items()}))
+registry.register(Gauge(
+    'microbatch_queue_delay_seconds_mean', 'Mean time a request waits to be batched',
+    callback=lambda: {(): micro_batcher.stats()['mean_queue_delay_ms'] / 1000}))
+registry.register(Gauge(
+    'websocket_connections', 'Open /ws/predict sessions',
+    callback=lambda: {(): len(feed_sessions)}))
+registry.register(Gauge(
+    'websocket_pending_messages', 'Messages received on /ws/predict and not yet answered',
+    callback=lambda: {(): sum(session.pending for session in feed_sessions)}))
+registry.register(Gauge(
+    'admission_in_flight', 'Requests holding an inference slot',
+    callback=lambda: {} if admission is None else {(): admission.in_flight}))
+registry.register(Gauge(
+    'admission_queue_depth', 'Requests waiting for an inference slot',
+    callback=lambda: {} if admission is None else {(): admission.queue_depth}))
+registry.register(Gauge(
+    'admission_concurrency_limit', 'Current adaptive concurrency limit',
+    callback=lambda: {} if admission is None else {(): admission.effective_limit}))
+registry.register(Counter(
+    'admission_shed_requests_total', 'Requests rejected with 503, by reason', labels=['reason'],
+    callback=lambda: {} if admission is None else {(reason,): n for reason, n in admission.shed.items()}))
+registry.register(Counter(
+    'prediction_cache_events_total', 'Prediction cache hits and misses', labels=['event'],
+    callback=lambda: {} if prediction_cache is None else {
+        ('hit',): prediction_cache.hits, ('miss',): prediction_cache.misses}))
+
+
+def warmup_rows() -> np.ndarray:
+    """Get the feature rows used to warm up the models, in FEATURES order."""
 
-app = FastAPI()
+    if not WARMUP_DATA:
+        return np.ones((1, len(FEATURES)))
+    if WARMUP_DATA.endswith('.npy'):
+        return np.atleast_2d(np.load(WARMUP_DATA)).astype(np.float64)
+
+    with open(WARMUP_DATA) as csv_file:
+        header = [name.strip() for name in csv_file.readline().split(',')]
+        rows = np.loadtxt(csv_file, delimiter=',', ndmin=2)
+    return rows[:, [header.index(name) for name in FEATURES]]
+
+
+async def warmup() -> None:
+    """Prime every inference path before the service reports ready.
+
+    Memory-mapped model tables are read once, then WARMUP_BATCH_SIZES
+    batches of warmup rows go through every version taking unrouted traffic
+    (chunked sklearn, compiled forest or pool workers) and one row goes
+    through the micro-batcher.
+    """
+
+    rows = warmup_rows()
+    for version in model_registry.weighted_names:
+        model = model_holder.current if version == MODEL_NAME else model_registry.get(version)
+        for engine in (model.estimator, model.engine):
+            if isinstance(engine, CompiledForest):
+                engine.touch_pages()
+        for batch_size in WARMUP_BATCH_SIZES:
+            await run_in_threadpool(predict_matrix, model, np.resize(rows, (batch_size, len(FEATURES))))
+
+    if MICROBATCH_ENABLED:
+        await micro_batcher.submit(rows[0].tolist())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+
+    # Load the model once, then watch the file for new versions pushed by DVC
+    started = time.perf_counter()
+    model_holder.load()
+    for version in model_registry.weighted_names:
+        if version != MODEL_NAME:
+            model_registry.get(version)
+    startup_report['model_load'] = time.perf_counter() - started
+    model_holder.start()
+    if inference_pool is not None:
+        inference_pool.start()
+    if MICROBATCH_ENABLED:
+        await micro_batcher.start()
+
+    # Only report ready once the models have answered the warmup batches
+    started = time.perf_counter()
+    await warmup()
+    startup_report['warmup'] = time.perf_counter() - started
+    startup_report['total'] = time.perf_counter() - STARTUP_STARTED
+    logger.info('Startup: ' + ', '.join(f'{phase} {seconds:.3f}s'
+                                        for phase, seconds in startup_report.items()))
+    app.state.ready = True
+    yield
+
+    # Leave the load balancer rotation before tearing anything down
+    app.state.ready = False
+    await micro_batcher.stop()
+    if inference_pool is not None:
+        inference_pool.stop()
+    model_holder.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware, latency=request_latency, requests=requests_total,
+                   errors=errors_total)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # Shed fast: the client backs off instead of waiting in an unbounded queue
+    return JSONResponse({"detail": str(exc)}, status_code=503,
+                        headers={'Retry-After': str(ADMISSION_RETRY_AFTER)})
 
 class Item(BaseModel):
     NOx_GT_: float
@@ -17,28 +326,453 @@ class Item(BaseModel):
     RH: float
     AH: float
 
+
+FEATURES = list(Item.__fields__)
+
+
+class BatchItems(BaseModel):
+    """Column-oriented batch: one array per feature, all the same length."""
+
+    NOx_GT_: List[float]
+    NO2_GT_: List[float]
+    PT08_S4_NO2_: List[float]
+    PT08_S5_O3_: List[float]
+    T: List[float]
+    RH: List[float]
+    AH: List[float]
+
+
+def columns_to_matrix(columns: dict) -> np.ndarray:
+    """Validate column arrays in bulk and stack them in training order.
+    Args:
+        columns {dict}: feature name -> sequence of numbers
+    Returns:
+        np.ndarray: C-contiguous float64 matrix of shape (n_rows, n_features)
+    """
+
+    missing = [name for name in FEATURES if name not in columns]
+    if missing:
+        raise ValueError(f'Missing features: {missing}')
+
+    arrays = []
+    for name in FEATURES:
+        try:
+            array = np.asarray(columns[name], dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f'Feature {name} must be an array of numbers')
+        if array.ndim != 1:
+            raise ValueError(f'Feature {name} must be a flat array')
+        arrays.append(array)
+
+    n_rows = len(arrays[0])
+    if any(len(array) != n_rows for array in arrays):
+        raise ValueError('All features must have the same length')
+
+    matrix = np.column_stack(arrays) if n_rows else np.empty((0, len(FEATURES)))
+    if not np.isfinite(matrix).all():
+        raise ValueError('Features must be finite numbers')
+
+    return matrix
+
+
+def first_invalid_row(model: Optional[LoadedModel], X: np.ndarray) -> Optional[Tuple[int, str]]:
+    """Find the first row the model's feature transform cannot map.
+
+    Every endpoint checks its rows before inference, so a bad reading (e.g.
+    a non-positive value in a Box-Cox feature) is answered with 422 instead
+    of failing a matrix shared with other requests. The -200 missing-value
+    sentinel is not an error: the transform imputes it in every feature.
+    Args:
+        model {LoadedModel}: model snapshot, None for the main model
+        X {np.ndarray}: feature matrix in FEATURES order
+    Returns:
+        Tuple[int, str]: row index and error message, None when every row is valid
+    """
+
+    transform = (model_holder.current if model is None else model).transform
+    if transform is None:
+        return None
+    invalid = np.flatnonzero(transform.invalid_rows(X))
+    if not len(invalid):
+        return None
+    return int(invalid[0]), f'Box-Cox features must be positive: {transform.boxcox_features}'
+
+
+def check_rows(model: Optional[LoadedModel], X: np.ndarray) -> None:
+    """Raise ValueError on non-finite values or on the first row the model cannot score."""
+
+    if not np.isfinite(X).all():
+        raise ValueError('Features must be finite numbers')
+    error = first_invalid_row(model, X)
+    if error is not None:
+        row, message = error
+        raise ValueError(message if X.shape[0] == 1 else f'row {row}: {message}')
+
+
+def predict_matrix(model: LoadedModel, X: np.ndarray, chunk_size: int = MAX_BATCH_CHUNK) -> np.ndarray:
+    """Predict a feature matrix in bounded chunks.
+
+    Raw Item values are first mapped to the training feature space with the
+    fused Box-Cox + min-max kernel when the model ships a transform artifact.
+    Small chunks go through the compiled forest, which avoids sklearn's
+    per-estimator dispatch; large ones stay on sklearn's compiled traversal.
+    A compact model is itself a compiled forest and scores every chunk.
+    In process-pool mode everything is scored by the worker processes.
+    Args:
+        model {LoadedModel}: model snapshot
+        X {np.ndarray}: feature matrix in FEATURES order
+        chunk_size {int}: maximum rows per predict call
+    Returns:
+        np.ndarray: predictions, one per row
+    """
+
+    if model.transform is not None:
+        X = model.transform.transform(X)
+
+    if inference_pool is not None:
+        with predict_latency.time('pool'):
+            predictions = inference_pool.predict(model.engine, X)
+        predicted_rows.inc('pool', amount=X.shape[0])
+        return predictions
+
+    predictions = np.empty(X.shape[0], dtype=np.float64)
+    for start in range(0, X.shape[0], chunk_size):
+        chunk = X[start:start + chunk_size]
+        if isinstance(model.estimator, CompiledForest):
+            engine, predictor = 'compiled', model.estimator
+        elif model.engine is not None and len(chunk) <= COMPILED_FOREST_MAX_ROWS:
+            engine, predictor = 'compiled', model.engine
+        else:
+            engine, predictor = 'sklearn', model.estimator
+        with predict_latency.time(engine):
+            predictions[start:start + len(chunk)] = predictor.predict(chunk)
+        predicted_rows.inc(engine, amount=len(chunk))
+
+    return predictions
+
+
+async def route(request: HTTPConnection) -> Tuple[str, Optional[LoadedModel]]:
+    """Pick the model version serving a request.
+
+    The X-Model-Version header selects a version by name; otherwise one is
+    drawn by weight. The main model is returned as None so callers keep its
+    micro-batched and cached path; other versions are loaded on first use.
+    """
+
+    requested = request.headers.get('x-model-version')
+    try:
+        name = model_registry.choose(requested)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f'Unknown model version {requested}')
+    if name == MODEL_NAME:
+        return name, None
+
+    # Loaded versions are taken without blocking; a load runs off the event loop
+    model = model_registry.peek(name)
+    if model is not None:
+        return name, model
+    try:
+        return name, await run_in_threadpool(model_registry.get, name)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f'Model version {name} could not be loaded: {e}')
+
+
+async def predict_row(model: Optional[LoadedModel], row: List[float]) -> float:
+    """Score one reading: coalesced by the micro-batcher for the main model, else in the thread pool."""
+
+    if model is not None:
+        return float((await run_in_threadpool(predict_matrix, model, np.array([row])))[0])
+    if MICROBATCH_ENABLED:
+        return await micro_batcher.submit(row)
+    return float((await run_in_threadpool(predict_current, np.array([row])))[0])
+
+
 @app.post("/predict")
-async def predict(features: Item):
+async def predict(features: Item, request: Request, response: Response):
+    version, model = await route(request)
+    response.headers['X-Model-Version'] = version
+
+    # Prepare input features for prediction, in training column order
+    with stage_latency.time('/predict', 'build'):
+        row = [getattr(features, name) for name in FEATURES]
+    try:
+        check_rows(model, np.array([row]))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
     try:
-        # Load your pre-trained machine learning model
-        model = joblib.load('model.joblib')
+        # Repeated readings are answered from the cache, for the main model only
+        use_cache = model is None and prediction_cache is not None
+        if use_cache:
+            cached = prediction_cache.get(row)
+            if cached is not None:
+                return {"CO(GT)": cached}
+            generation = prediction_cache.generation
 
-        # Prepare input features for prediction
-        features_df = pd.DataFrame([features.dict()])
+        # Make predictions: coalesced with concurrent requests, always off the event loop
+        async with admitted():
+            with version_latency.time(version):
+                prediction = await predict_row(model, row)
+        version_predictions.inc(version)
 
-        # Make predictions
-        prediction = model.predict(features_df)
+        if use_cache:
+            prediction_cache.put(row, prediction, generation)
 
         # Return the prediction as JSON response
-        return {"CO(GT)": prediction[0]}
+        return {"CO(GT)": prediction}
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post(
+    "/predict/batch",
+    openapi_extra={'requestBody': {'content': {
+        'application/json': {'schema': BatchItems.schema()},
+        'application/x-npy': {'schema': {'type': 'string', 'format': 'binary'}},
+        'application/octet-stream': {'schema': {'type': 'string', 'format': 'binary'}},
+    }}},
+)
+async def predict_batch(request: Request):
+    """Score a column-oriented JSON batch or a binary feature matrix.
+
+    Binary bodies are an .npy array (application/x-npy) or raw little-endian
+    floats (application/octet-stream, X-Dtype float32|float64), one row per
+    reading, with an optional X-Feature-Order header. They are read as a
+    zero-copy view and answered in the same binary form.
+    """
+
+    version, model = await route(request)
+    predict_fn = predict_current if model is None else partial(predict_matrix, model)
+    headers = {'X-Model-Version': version}
+
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    binary = content_type in BINARY_CONTENT_TYPES
+    dtype = request.headers.get('x-dtype', 'float32')
+
+    # The body is validated in bulk with NumPy instead of one pydantic float per value
+    try:
+        body = await request.body()
+        if binary:
+            with stage_latency.time('/predict/batch', 'parse'):
+                X = decode_features(body, content_type, FEATURES,
+                                    feature_order=request.headers.get('x-feature-order'), dtype=dtype)
+        else:
+            with stage_latency.time('/predict/batch', 'parse'):
+                columns = json.loads(body)
+            if not isinstance(columns, dict):
+                raise ValueError('Body must be an object of feature arrays')
+            with stage_latency.time('/predict/batch', 'build'):
+                X = columns_to_matrix(columns)
+        check_rows(model, X)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if X.shape[0] > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f'Batch larger than {MAX_BATCH_ROWS} rows')
+
+    # Batches hold a slot but do not steer the limit: their latency grows with their size
+    async with admitted(adapt=False):
+        try:
+            with version_latency.time(version):
+                predictions = await run_in_threadpool(predict_fn, X)
+            version_predictions.inc(version, amount=X.shape[0])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    with stage_latency.time('/predict/batch', 'encode'):
+        if binary:
+            return Response(encode_predictions(predictions, content_type, dtype), media_type=content_type,
+                            headers=headers)
+        return JSONResponse({"CO(GT)": predictions.tolist()}, headers=headers)
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request):
+    """Score a streamed NDJSON (default) or CSV body of Item records.
+
+    The body is read as it arrives and scored STREAM_CHUNK_ROWS rows at a
+    time; a line over STREAM_MAX_LINE_BYTES is refused with 422. Encoded predictions go to a buffer that spills to disk past
+    STREAM_SPOOL_BYTES, which is then streamed back in the same format
+    (one JSON object per line, or a one-column CSV). Plain HTTP/1.1 clients
+    only read the response once the upload is done, so the output is
+    spooled instead of being written while the body is still coming in.
+    """
 
+    version, model = await route(request)
+    predict_fn = predict_current if model is None else partial(predict_matrix, model)
+
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    is_csv = content_type == 'text/csv'
+    lines = iter_lines(request.stream(), STREAM_MAX_LINE_BYTES)
+    output = spooled_output(STREAM_SPOOL_BYTES)
+
+    try:
+        if is_csv:
+            parse = csv_parser(FEATURES, await lines.__anext__())
+            output.write(b'CO(GT)\n')
+            first_line = 2
+        else:
+            parse = ndjson_parser(FEATURES)
+            first_line = 1
+
+        async for X in iter_row_chunks(lines, parse, STREAM_CHUNK_ROWS, first_line=first_line,
+                                       validate=partial(first_invalid_row, model)):
+            # A slot per chunk: a slow upload holds none while its body is still arriving
+            async with admitted(adapt=False):
+                with version_latency.time(version):
+                    predictions = await run_in_threadpool(predict_fn, X)
+            version_predictions.inc(version, amount=X.shape[0])
+            with stage_latency.time('/predict/stream', 'encode'):
+                if is_csv:
+                    output.write(''.join(f'{p!r}\n' for p in predictions.tolist()).encode())
+                else:
+                    output.write(''.join(f'{{"CO(GT)": {p!r}}}\n' for p in predictions.tolist()).encode())
+    except StopAsyncIteration:
+        output.close()
+        raise HTTPException(status_code=422, detail='Empty CSV body')
+    except StreamFormatError as e:
+        output.close()
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded:
+        output.close()
+        raise
     except Exception as e:
+        output.close()
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+    media_type = 'text/csv' if is_csv else 'application/x-ndjson'
+    return StreamingResponse(iter_file(output), media_type=media_type, headers={'X-Model-Version': version})
+
+def feed_message_matrix(message, model: Optional[LoadedModel]) -> Tuple[np.ndarray, bool]:
+    """Parse and validate the readings of one WebSocket message.
+    Args:
+        message: decoded JSON message
+        model {LoadedModel}: model snapshot, None for the main model
+    Returns:
+        Tuple[np.ndarray, bool]: feature matrix in FEATURES order, and whether it was a single reading
+    Raises:
+        ValueError: malformed message, missing feature or values the model cannot score
+    """
+
+    readings = message['readings'] if isinstance(message, dict) and 'readings' in message else message
+    single = isinstance(readings, dict)
+    rows = [readings] if single else readings
+    if not isinstance(rows, list) or not rows:
+        raise ValueError('Expected a reading, a list of readings or {"readings": [...]}')
+    if len(rows) > WS_MAX_BATCH_ROWS:
+        raise ValueError(f'Batch larger than {WS_MAX_BATCH_ROWS} rows')
+    try:
+        X = np.array([[float(row[name]) for name in FEATURES] for row in rows], dtype=np.float64)
+    except KeyError as e:
+        raise ValueError(f'Missing feature {e}')
+    except TypeError as e:
+        raise ValueError(str(e))
+    check_rows(model, X)
+
+    return X, single
+
+
+async def score_feed_message(message, version: str, model: Optional[LoadedModel]) -> dict:
+    """Score one WebSocket message and build its reply.
+
+    A message is one Item-shaped reading, an object with a ``readings`` list
+    or a bare list of readings; an optional ``id`` is echoed back. Errors are
+    answered on the connection instead of closing it.
+    """
+
+    reply = {'id': message_id(message)}
+    try:
+        X, single = feed_message_matrix(message, model)
+    except ValueError as e:
+        return dict(reply, error=str(e))
+
+    try:
+        # Single readings of the main model are coalesced with the HTTP traffic
+        async with admitted(adapt=single):
+            with version_latency.time(version):
+                if single and model is None and MICROBATCH_ENABLED:
+                    predictions = [await micro_batcher.submit(X[0].tolist())]
+                else:
+                    predict_fn = predict_current if model is None else partial(predict_matrix, model)
+                    predictions = (await run_in_threadpool(predict_fn, X)).tolist()
+        version_predictions.inc(version, amount=len(predictions))
+    except Overloaded as e:
+        return dict(reply, error=str(e), retry_after=ADMISSION_RETRY_AFTER)
+    except Exception as e:
+        return dict(reply, error=str(e))
+
+    return dict(reply, **{"CO(GT)": predictions[0] if single else predictions})
+
+@app.websocket("/ws/predict")
+async def predict_feed(websocket: WebSocket):
+    """Score a continuous feed of readings over one long-lived connection.
+
+    Replies come back in message order. The model version is chosen once
+    per connection, from the X-Model-Version header or by weight. At most
+    WS_MAX_PENDING messages are buffered per connection, and a client that
+    does not read its replies within WS_SEND_TIMEOUT seconds is
+    disconnected.
+    """
+
+    try:
+        version, model = await route(websocket)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    await websocket.accept(headers=[(b'x-model-version', version.encode())])
+    session = FeedSession(websocket, partial(score_feed_message, version=version, model=model),
+                          max_pending=WS_MAX_PENDING, send_timeout=WS_SEND_TIMEOUT)
+    feed_sessions.add(session)
+    try:
+        await session.run()
+    finally:
+        feed_sessions.discard(session)
+
+@app.get("/predict/stats")
+async def predict_stats():
+    return {
+        "batching": micro_batcher.stats(),
+        "cache": prediction_cache.stats() if prediction_cache is not None else None,
+        "admission": admission.stats() if admission is not None else None,
+    }
+
+@app.get("/models")
+async def models():
+    return model_registry.stats()
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process is up and its event loop answers."""
+
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: models and transforms loaded and warmed up, not shutting down."""
+
+    if not getattr(app.state, 'ready', False) or not model_holder.loaded:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready", "model_version": model_holder.current.version}
+
+@app.get("/startup")
+async def startup():
+    return startup_report
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
 
+# Every import above is needed to serve; anything heavier is deferred to model loading
+startup_report['import'] = time.perf_counter() - STARTUP_STARTED
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,199 @@
+"""Low-overhead in-process metrics rendered in Prometheus text format."""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+from typing import (Callable, Dict, Iterator, List, Optional, Sequence, Text,
+                    Tuple)
+
+
+# Latency buckets in seconds, from 100 microseconds to 5 seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names: Sequence[Text], values: Sequence[Text],
+                   extra: Text = '') -> Text:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic counter with optional labels.
+
+    It is incremented, or read from a callback at scrape time. A callback
+    must return running totals that never decrease, e.g. counts kept by
+    another component.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name: Text, documentation: Text,
+                 labels: Sequence[Text] = (),
+                 callback: Optional[Callable[[], Dict[Tuple, float]]] = None
+                 ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.callback = callback
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: Text, amount: float = 1.0) -> None:
+        with self._lock:
+            previous = self._values.get(label_values, 0.0)
+            self._values[label_values] = previous + amount
+
+    def get(self, *label_values: Text) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> List[Text]:
+        values = self.callback() if self.callback is not None else self._values
+        return [f'{self.name}{_format_labels(self.labels, key)} {value}'
+                for key, value in sorted(values.items())]
+
+
+class Gauge:
+    """Value set directly or read from a callback at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: Text, documentation: Text,
+                 labels: Sequence[Text] = (),
+                 callback: Optional[Callable[[], Dict[Tuple, float]]] = None
+                 ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.callback = callback
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, *label_values: Text) -> None:
+        self._values[label_values] = value
+
+    def clear(self) -> None:
+        self._values = {}
+
+    def samples(self) -> List[Text]:
+        values = self.callback() if self.callback is not None else self._values
+        return [f'{self.name}{_format_labels(self.labels, key)} {value}'
+                for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: Text, documentation: Text,
+                 labels: Sequence[Text] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: Text) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values: Text) -> Iterator[None]:
+        """Observe the wall time of the enclosed block."""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values: Text) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series is not None else 0
+
+    def samples(self) -> List[Text]:
+        lines = []
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            bounds = self.buckets + (float('inf'),)
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.labels, key, 'le="' + le + '"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """Collection of metrics exposed on one /metrics page."""
+
+    def __init__(self) -> None:
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> Text:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route.
+
+    Plain ASGI rather than BaseHTTPMiddleware, so it adds only a couple of
+    perf_counter calls and dictionary updates per request and does not
+    buffer streaming responses.
+    """
+
+    def __init__(self, app, latency: Histogram, requests: Counter,
+                 errors: Counter) -> None:
+        self.app = app
+        self.latency = latency
+        self.requests = requests
+        self.errors = errors
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = ['500']
+
+        async def send_wrapper(message) -> None:
+            if message['type'] == 'http.response.start':
+                status[0] = str(message['status'])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Route templates keep the label set bounded, unknown paths fall
+            # in 'other'
+            path = getattr(scope.get('route'), 'path', 'other')
+            self.latency.observe(time.perf_counter() - start, path)
+            self.requests.inc(path, status[0])
+            if status[0] >= '500':
+                self.errors.inc(path)
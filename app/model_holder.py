@@ -0,0 +1,210 @@
+"""Keeps the serving model in memory and hot-swaps it when the file changes."""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Callable, List, NamedTuple, Optional, Text, Tuple
+
+
+logger = logging.getLogger('MODEL_HOLDER')
+
+
+class LoadedModel(NamedTuple):
+    """Immutable snapshot of a loaded model.
+
+    A request grabs one snapshot and uses it until it finishes, so a swap
+    happening in the middle of a prediction never affects that request.
+    """
+
+    estimator: Any
+    version: Text
+    path: Text
+    mtime: Tuple[float, ...]
+    engine: Any = None
+    transform: Any = None
+
+
+def file_digest(path: Text, chunk_size: int = 1 << 20) -> Text:
+    """Get a short sha256 digest of a file.
+    Args:
+        path {Text}: path to file
+        chunk_size {int}: bytes read per iteration
+    Returns:
+        Text: first 12 hex characters of the digest
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()[:12]
+
+
+class ModelHolder:
+    """Holds the current model and reloads it in the background.
+
+    A daemon thread polls the model file mtime every ``poll_interval``
+    seconds. When it changes, the file is hashed; if the content is new the
+    model is fully deserialized off the request path and then published with
+    a single reference assignment. In-flight requests keep using the snapshot
+    they already took, so no request is dropped or fails during a swap.
+
+    An optional ``build_engine`` callable turns the estimator into a faster
+    inference engine (e.g. a compiled forest); it runs before the swap so the
+    engine is never missing from a published snapshot.
+
+    ``load_model`` reads the model file (``joblib.load`` by default), so other
+    artifact formats such as the compact ``.npz`` forest can be served.
+
+    When ``transform_path`` exists it is loaded with ``load_transform`` into
+    the same snapshot, and a change to either file triggers a reload, so the
+    model and its feature transform are always swapped together. A missing
+    transform is logged as a warning, or fails the load with
+    ``require_transform``: a model trained on transformed features would
+    otherwise be fed raw readings.
+    """
+
+    def __init__(self, path: Text, poll_interval: float = 5.0,
+                 build_engine: Optional[Callable[[Any], Any]] = None,
+                 transform_path: Optional[Text] = None,
+                 load_transform: Optional[Callable[[Text], Any]] = None,
+                 load_model: Optional[Callable[[Text], Any]] = None,
+                 require_transform: bool = False) -> None:
+        self.path = path
+        self.poll_interval = poll_interval
+        self.build_engine = build_engine
+        self.transform_path = transform_path
+        self.load_transform = load_transform
+        self.load_model = load_model
+        self.require_transform = require_transform
+        self._current: Optional[LoadedModel] = None
+        self._listeners: List[Callable[[LoadedModel], None]] = []
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def current(self) -> LoadedModel:
+        """Get the current model snapshot."""
+
+        if self._current is None:
+            raise RuntimeError('Model is not loaded')
+        return self._current
+
+    @property
+    def loaded(self) -> bool:
+        return self._current is not None
+
+    def add_listener(self, callback: Callable[[LoadedModel], None]) -> None:
+        """Register a callback executed after every swap."""
+
+        self._listeners.append(callback)
+
+    def load(self) -> LoadedModel:
+        """Load the model file synchronously and publish it."""
+
+        with self._reload_lock:
+            return self._load_locked()
+
+    def unload(self) -> None:
+        """Drop the current snapshot; the next ``load`` reads the file again."""
+
+        with self._reload_lock:
+            self._current = None
+
+    def reload_if_changed(self) -> bool:
+        """Reload the model if the file on disk is new.
+        Returns:
+            bool: True when a new model was swapped in
+        """
+
+        with self._reload_lock:
+            current = self._current
+            try:
+                mtime = self._mtime()
+            except FileNotFoundError:
+                # DVC replaces the file by unlink + link; wait for it
+                return False
+
+            if current is not None and mtime == current.mtime:
+                return False
+
+            if current is not None and self._version() == current.version:
+                # Same content, only touched: remember the mtime
+                self._current = current._replace(mtime=mtime)
+                return False
+
+            self._load_locked()
+            return True
+
+    def start(self) -> None:
+        """Start the background watcher thread."""
+
+        if self._thread is not None or self.poll_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background watcher thread."""
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _has_transform(self) -> bool:
+        return self.transform_path is not None and os.path.exists(self.transform_path)
+
+    def _mtime(self) -> Tuple[float, ...]:
+        mtime = (os.stat(self.path).st_mtime,)
+        if self._has_transform():
+            mtime += (os.stat(self.transform_path).st_mtime,)
+        return mtime
+
+    def _version(self) -> Text:
+        version = file_digest(self.path)
+        if self._has_transform():
+            version += '-' + file_digest(self.transform_path)[:6]
+        return version
+
+    def _load_locked(self) -> LoadedModel:
+        load_model = self.load_model
+        if load_model is None:
+            # Deferred: joblib (and sklearn, pulled in by unpickling) only load with the model
+            import joblib
+            load_model = joblib.load
+
+        if self.transform_path is not None and not self._has_transform():
+            if self.require_transform:
+                raise FileNotFoundError(f'Feature transform {self.transform_path} not found')
+            logger.warning(f'Feature transform {self.transform_path} not found, '
+                           f'serving {self.path} on raw features')
+
+        mtime = self._mtime()
+        version = self._version()
+        estimator = load_model(self.path)
+        engine = self.build_engine(estimator) if self.build_engine is not None else None
+        transform = self.load_transform(self.transform_path) if self._has_transform() else None
+
+        loaded = LoadedModel(estimator=estimator, version=version, path=self.path, mtime=mtime,
+                             engine=engine, transform=transform)
+        # Single reference assignment: readers see either the old or the new snapshot
+        self._current = loaded
+        logger.info(f'Model {version} loaded from {self.path}')
+
+        for callback in self._listeners:
+            callback(loaded)
+
+        return loaded
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload_if_changed()
+            except Exception:
+                # A half-written file must not kill the watcher; keep the old model
+                logger.exception('Model reload failed, keeping current model')
@@ -0,0 +1,230 @@
+"""Several model versions held in memory side by side, with traffic splitting."""
+
+from collections import OrderedDict
+import logging
+import random
+import threading
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from model_holder import LoadedModel, ModelHolder
+
+
+logger = logging.getLogger('MODEL_REGISTRY')
+
+
+def estimate_nbytes(obj: Any) -> int:
+    """Estimate the memory held by a model or inference engine.
+
+    Counts the node tables of sklearn trees and forests and the arrays of a
+    compiled forest, which are what dominates the footprint of this repo's
+    models; other objects count as 0.
+    """
+
+    if obj is None:
+        return 0
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    total = 0
+    for estimator in getattr(obj, 'estimators_', [obj]):
+        tree = getattr(estimator, 'tree_', None)
+        if tree is not None:
+            total += tree.__getstate__()['nodes'].nbytes + tree.value.nbytes
+    return total
+
+
+def model_nbytes(model: LoadedModel) -> int:
+    return estimate_nbytes(model.estimator) + estimate_nbytes(model.engine)
+
+
+def parse_versions(spec: Text) -> List[Tuple[Text, Text, float]]:
+    """Parse ``name=path[:weight],...`` into (name, path, weight) entries.
+    Args:
+        spec {Text}: version list, e.g. 'canary=models/new.joblib:0.1'
+    Returns:
+        List[Tuple[Text, Text, float]]: weight defaults to 0 (header-only)
+    """
+
+    versions = []
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        name, sep, target = entry.partition('=')
+        if not sep or not name or not target:
+            raise ValueError(f'Invalid model version {entry!r}, expected name=path[:weight]')
+        path, sep, weight = target.rpartition(':')
+        if not sep:
+            path, weight = target, '0'
+        versions.append((name.strip(), path.strip(), float(weight)))
+
+    return versions
+
+
+class ModelRegistry:
+    """Model versions loaded lazily and evicted LRU under a memory budget.
+
+    Each version is a ``ModelHolder``. Pinned versions (the main model, which
+    keeps its own hot-swap watcher) are loaded up front and never evicted;
+    the others are loaded on the first request routed to them. After every
+    load the least recently used unpinned versions are unloaded until the
+    estimated footprint fits ``memory_budget`` bytes. Requests still holding
+    the snapshot of an evicted version finish with it; the memory is freed
+    once they are done. A load only holds that version's own lock, so
+    requests for loaded versions never wait behind it. Unpinned versions
+    are not watched for changes: a retrained model is rolled out under a
+    new name.
+
+    A request names its version explicitly or gets one drawn at random in
+    proportion to the version weights, so a canary can take a small share of
+    the traffic while everything else stays on the main model.
+    """
+
+    def __init__(self, memory_budget: int) -> None:
+        self.memory_budget = memory_budget
+        self._holders: Dict[Text, ModelHolder] = {}
+        self._weights: Dict[Text, float] = {}
+        self._pinned: Dict[Text, bool] = {}
+        self._sizes: Dict[Text, int] = {}
+        # Loaded versions, least recently used first
+        self._lru: 'OrderedDict[Text, None]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Text, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def names(self) -> List[Text]:
+        return list(self._holders)
+
+    @property
+    def weighted_names(self) -> List[Text]:
+        """Versions taking a share of unrouted traffic."""
+
+        return [name for name, weight in self._weights.items() if weight > 0]
+
+    def add(self, name: Text, holder: ModelHolder, weight: float = 0.0, pinned: bool = False) -> None:
+        """Register a version.
+        Args:
+            name {Text}: version name used in routing and metrics
+            holder {ModelHolder}: holder of the version's model file
+            weight {float}: relative share of unrouted traffic, 0 for header-only
+            pinned {bool}: never evict; the holder is loaded by its owner
+        """
+
+        if weight < 0:
+            raise ValueError(f'Negative weight for model version {name}')
+        self._holders[name] = holder
+        self._weights[name] = weight
+        self._pinned[name] = pinned
+        self._load_locks[name] = threading.Lock()
+        if pinned:
+            # Pinned holders swap on their own; keep their footprint up to date
+            holder.add_listener(lambda model: self._sizes.__setitem__(name, model_nbytes(model)))
+
+    def remove(self, name: Text) -> None:
+        """Unregister an unpinned version and drop its model."""
+
+        with self._lock:
+            if self._pinned[name]:
+                raise ValueError(f'Model version {name} is pinned')
+            self._holders.pop(name).unload()
+            for mapping in (self._weights, self._pinned, self._sizes, self._lru, self._load_locks):
+                mapping.pop(name, None)
+
+    def choose(self, requested: Optional[Text] = None) -> Text:
+        """Pick the version serving a request.
+        Args:
+            requested {Text}: explicit version name, e.g. from a header
+        Returns:
+            Text: version name
+        Raises:
+            KeyError: unknown version, or no version takes unrouted traffic
+        """
+
+        if requested:
+            if requested not in self._holders:
+                raise KeyError(requested)
+            return requested
+
+        names = self.weighted_names
+        if not names:
+            raise KeyError('no weighted model version')
+        if len(names) == 1:
+            return names[0]
+        return random.choices(names, weights=[self._weights[name] for name in names])[0]
+
+    def is_loaded(self, name: Text) -> bool:
+        return self._holders[name].loaded
+
+    def peek(self, name: Text) -> Optional[LoadedModel]:
+        """Get the snapshot of a loaded version without blocking, None when it is not loaded.
+
+        Safe to call on the event loop: no lock is taken, only the LRU order
+        is refreshed.
+        """
+
+        try:
+            model = self._holders[name].current
+        except RuntimeError:
+            return None
+        try:
+            self._lru.move_to_end(name)
+        except KeyError:
+            # Pinned versions loaded by their owner are not tracked until their first get
+            pass
+        return model
+
+    def get(self, name: Text) -> LoadedModel:
+        """Get the current snapshot of a version, loading it if needed (blocking)."""
+
+        model = self.peek(name)
+        if model is not None and name in self._lru:
+            return model
+
+        holder = self._holders[name]
+        # Only this version waits for its load; the registry lock guards the bookkeeping
+        with self._load_locks[name]:
+            if not holder.loaded:
+                holder.load()
+                self.loads += 1
+                logger.info(f'Model version {name} loaded')
+            model = holder.current
+            with self._lock:
+                self._sizes[name] = model_nbytes(model)
+                self._lru[name] = None
+                self._lru.move_to_end(name)
+                self._evict(keep=name)
+        return model
+
+    def _evict(self, keep: Text) -> None:
+        for name in list(self._lru):
+            if self.memory_bytes() <= self.memory_budget:
+                break
+            if name == keep or self._pinned[name]:
+                continue
+            self._holders[name].unload()
+            del self._lru[name]
+            self._sizes.pop(name, None)
+            self.evictions += 1
+            logger.info(f'Model version {name} evicted')
+
+    def memory_bytes(self) -> int:
+        return sum(size for name, size in self._sizes.items() if self._holders[name].loaded)
+
+    def stats(self) -> Dict:
+        return {
+            'memory_budget_bytes': self.memory_budget,
+            'memory_bytes': self.memory_bytes(),
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'versions': {
+                name: {
+                    'path': holder.path,
+                    'weight': self._weights[name],
+                    'pinned': self._pinned[name],
+                    'loaded': holder.loaded,
+                    'version': holder.current.version if holder.loaded else None,
+                    'nbytes': self._sizes.get(name) if holder.loaded else None,
+                }
+                for name, holder in self._holders.items()
+            },
+        }
@@ -0,0 +1,100 @@
+"""Binary columnar payloads (.npy / raw little-endian floats) for prediction."""
+
+import io
+from typing import Optional, Sequence, Text
+
+import numpy as np
+
+
+NPY_CONTENT_TYPE = 'application/x-npy'
+RAW_CONTENT_TYPE = 'application/octet-stream'
+BINARY_CONTENT_TYPES = (NPY_CONTENT_TYPE, RAW_CONTENT_TYPE)
+
+RAW_DTYPES = {'float32': np.dtype('<f4'), 'float64': np.dtype('<f8')}
+
+
+def feature_permutation(features: Sequence[Text], feature_order: Optional[Text]) -> Optional[np.ndarray]:
+    """Get the column indices that put a payload in ``features`` order.
+    Args:
+        features {Sequence[Text]}: training column order
+        feature_order {Text}: comma-separated column order of the payload, or None
+    Returns:
+        np.ndarray or None when the payload is already in training order
+    """
+
+    if not feature_order:
+        return None
+
+    columns = [name.strip() for name in feature_order.split(',')]
+    if sorted(columns) != sorted(features):
+        raise ValueError(f'Feature order must list exactly: {list(features)}')
+    if columns == list(features):
+        return None
+
+    return np.array([columns.index(name) for name in features])
+
+
+def decode_npy(body: bytes) -> np.ndarray:
+    """Read a .npy payload as a view on the request body (no copy)."""
+
+    header = io.BytesIO(body)
+    version = np.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+    if dtype.kind != 'f':
+        raise ValueError('.npy payload must hold floats')
+
+    count = int(np.prod(shape))
+    array = np.frombuffer(body, dtype=dtype, count=count, offset=header.tell())
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def decode_raw(body: bytes, dtype: Text, n_features: int) -> np.ndarray:
+    """Read a raw little-endian float buffer as an (n_rows, n_features) view."""
+
+    if dtype not in RAW_DTYPES:
+        raise ValueError(f'Unsupported dtype {dtype}, use one of {list(RAW_DTYPES)}')
+    row_bytes = RAW_DTYPES[dtype].itemsize * n_features
+    if len(body) % row_bytes:
+        raise ValueError(f'Body size is not a multiple of {row_bytes} bytes per row')
+
+    return np.frombuffer(body, dtype=RAW_DTYPES[dtype]).reshape(-1, n_features)
+
+
+def decode_features(body: bytes, content_type: Text, features: Sequence[Text],
+                    feature_order: Optional[Text] = None, dtype: Text = 'float32') -> np.ndarray:
+    """Decode a binary payload into a matrix in ``features`` order.
+
+    The matrix is a zero-copy view of the body unless ``feature_order``
+    requires reordering the columns.
+    """
+
+    if content_type == NPY_CONTENT_TYPE:
+        X = decode_npy(body)
+    else:
+        X = decode_raw(body, dtype, len(features))
+
+    if X.ndim != 2 or X.shape[1] != len(features):
+        raise ValueError(f'Payload must have shape (n_rows, {len(features)})')
+
+    permutation = feature_permutation(features, feature_order)
+    if permutation is not None:
+        X = X[:, permutation]
+
+    if not np.isfinite(X).all():
+        raise ValueError('Features must be finite numbers')
+
+    return X
+
+
+def encode_predictions(predictions: np.ndarray, content_type: Text, dtype: Text = 'float32') -> bytes:
+    """Encode predictions in the same binary form as the request."""
+
+    if content_type == NPY_CONTENT_TYPE:
+        buffer = io.BytesIO()
+        np.save(buffer, predictions, allow_pickle=False)
+        return buffer.getvalue()
+
+    return predictions.astype(RAW_DTYPES[dtype], copy=False).tobytes()
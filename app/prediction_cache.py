@@ -0,0 +1,93 @@
+"""Bounded cache of predictions keyed on the feature vector."""
+
+from collections import OrderedDict
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+
+class PredictionCache:
+    """LRU cache of predictions with optional TTL and key rounding.
+
+    Keys are the feature vector rounded to ``decimals`` places, so sensor
+    plateaus and repeated imputed values hit the same entry. Entries are
+    evicted least-recently-used once ``max_size`` is reached and, when
+    ``ttl`` is set, expire that many seconds after being stored.
+
+    ``clear`` bumps a generation number. Callers take ``generation`` before
+    predicting and pass it back to ``put``; a value computed with a model
+    that has been swapped out in the meantime is then dropped instead of
+    being cached.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = None,
+                 decimals: Optional[int] = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.decimals = decimals
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[Tuple, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, row: Sequence[float]) -> Tuple:
+        if self.decimals is None:
+            return tuple(row)
+        return tuple(round(value, self.decimals) for value in row)
+
+    def get(self, row: Sequence[float]) -> Optional[float]:
+        """Get a cached prediction or None."""
+
+        key = self.key(row)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, row: Sequence[float], value: float, generation: Optional[int] = None) -> None:
+        """Store a prediction computed during ``generation``."""
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+        key = self.key(row)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, *args) -> None:
+        """Drop every entry; usable directly as a model swap listener."""
+
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters."""
+
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'generation': self.generation,
+        }
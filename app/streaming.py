@@ -0,0 +1,142 @@
+"""Chunked parsing of streamed NDJSON / CSV bodies and spooled responses."""
+
+import json
+import tempfile
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Sequence, Text, Tuple
+
+import numpy as np
+
+
+class StreamFormatError(ValueError):
+    """A streamed record could not be parsed; ``line`` is 1-based."""
+
+    def __init__(self, line: int, message: Text) -> None:
+        super().__init__(f'line {line}: {message}')
+        self.line = line
+
+
+async def iter_lines(chunks: AsyncIterator[bytes],
+                     max_line_bytes: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without buffering the whole body.
+
+    Only each new chunk is split: the unfinished line is kept as a list of
+    pieces and joined once, when it ends. A line longer than
+    ``max_line_bytes`` raises StreamFormatError instead of growing the
+    buffer without bound.
+    """
+
+    pending: List[bytes] = []
+    pending_size = 0
+    line_number = 1
+    async for chunk in chunks:
+        *ended, tail = chunk.split(b'\n')
+        for piece in ended:
+            if max_line_bytes is not None and pending_size + len(piece) > max_line_bytes:
+                raise StreamFormatError(line_number, f'line longer than {max_line_bytes} bytes')
+            pending.append(piece)
+            yield b''.join(pending)
+            pending, pending_size = [], 0
+            line_number += 1
+        if tail:
+            pending.append(tail)
+            pending_size += len(tail)
+            if max_line_bytes is not None and pending_size > max_line_bytes:
+                raise StreamFormatError(line_number, f'line longer than {max_line_bytes} bytes')
+    if pending:
+        yield b''.join(pending)
+
+
+def ndjson_parser(features: Sequence[Text]) -> Callable[[bytes, int], List[float]]:
+    """Build a parser of one NDJSON object into a row in ``features`` order."""
+
+    def parse(line: bytes, line_number: int) -> List[float]:
+        try:
+            record = json.loads(line)
+            return [float(record[name]) for name in features]
+        except KeyError as e:
+            raise StreamFormatError(line_number, f'missing feature {e}')
+        except (TypeError, ValueError) as e:
+            raise StreamFormatError(line_number, str(e))
+
+    return parse
+
+
+def csv_parser(features: Sequence[Text], header: bytes) -> Callable[[bytes, int], List[float]]:
+    """Build a parser of one CSV line into a row in ``features`` order.
+
+    The header may list the features in any order and carry extra columns.
+    """
+
+    columns = [name.strip() for name in header.decode().strip().split(',')]
+    missing = [name for name in features if name not in columns]
+    if missing:
+        raise StreamFormatError(1, f'missing features in header: {missing}')
+    positions = [columns.index(name) for name in features]
+
+    def parse(line: bytes, line_number: int) -> List[float]:
+        values = line.decode().strip().split(',')
+        if len(values) != len(columns):
+            raise StreamFormatError(line_number, f'expected {len(columns)} values, got {len(values)}')
+        try:
+            return [float(values[i]) for i in positions]
+        except ValueError as e:
+            raise StreamFormatError(line_number, str(e))
+
+    return parse
+
+
+async def iter_row_chunks(lines: AsyncIterator[bytes], parse: Callable[[bytes, int], List[float]],
+                          chunk_size: int, first_line: int = 1,
+                          validate: Optional[Callable[[np.ndarray], Optional[Tuple[int, Text]]]] = None
+                          ) -> AsyncIterator[np.ndarray]:
+    """Parse lines into float64 matrices of at most ``chunk_size`` rows.
+
+    Blank lines are skipped; a malformed line or a non-finite value (NaN,
+    Infinity) raises StreamFormatError, as a batch would be refused.
+    ``validate`` checks each chunk and returns the index and error of its
+    first invalid row, or None; that row's line raises StreamFormatError too.
+    """
+
+    rows, line_numbers = [], []
+    line_number = first_line - 1
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        rows.append(parse(line, line_number))
+        line_numbers.append(line_number)
+        if len(rows) == chunk_size:
+            yield _to_chunk(rows, line_numbers, validate)
+            rows, line_numbers = [], []
+    if rows:
+        yield _to_chunk(rows, line_numbers, validate)
+
+
+def _to_chunk(rows: List[List[float]], line_numbers: List[int],
+              validate: Optional[Callable[[np.ndarray], Optional[Tuple[int, Text]]]]) -> np.ndarray:
+    X = np.array(rows, dtype=np.float64)
+    finite = np.isfinite(X).all(axis=1)
+    if not finite.all():
+        raise StreamFormatError(line_numbers[int(np.argmin(finite))], 'Features must be finite numbers')
+    error = validate(X) if validate is not None else None
+    if error is not None:
+        row, message = error
+        raise StreamFormatError(line_numbers[row], message)
+    return X
+
+
+def spooled_output(max_memory: int) -> tempfile.SpooledTemporaryFile:
+    """Get a buffer for encoded predictions that spills to disk past max_memory bytes."""
+
+    return tempfile.SpooledTemporaryFile(max_size=max_memory, mode='w+b')
+
+
+def iter_file(f, block_size: int = 1 << 16) -> Iterator[bytes]:
+    """Stream a buffer from the start in fixed-size blocks and close it."""
+
+    try:
+        f.seek(0)
+        for block in iter(lambda: f.read(block_size), b''):
+            yield block
+    finally:
+        f.close()
@@ -0,0 +1,125 @@
+"""Process-pool inference over one memory-mapped compiled model."""
+
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Optional, Text
+
+import numpy as np
+
+from utils.forest import CompiledForest
+
+
+logger = logging.getLogger('INFERENCE_POOL')
+
+# Per worker process: artifact directory -> memory-mapped forest
+_forests: Dict[Text, CompiledForest] = {}
+
+
+def _predict_in_worker(artifact_dir: Text, X: np.ndarray,
+                       keep_versions: int = 1) -> np.ndarray:
+    forest = _forests.pop(artifact_dir, None)
+    if forest is None:
+        # A new model version: map its files, dropping the least recently
+        # used mappings
+        while len(_forests) >= keep_versions:
+            _forests.pop(next(iter(_forests)))
+        forest = CompiledForest.load(artifact_dir, mmap_mode='r')
+    # Re-inserted last: dict order is the least recently used order
+    _forests[artifact_dir] = forest
+    return forest.predict(X)
+
+
+class InferencePool:
+    """Runs compiled-forest predictions in a pool of worker processes.
+
+    ``build_engine`` is used as the ModelHolder engine builder: it compiles
+    the estimator, dumps the node tables once into ``root/<digest>`` and
+    returns a forest memory-mapped from those files. Workers map the same
+    files, so every process shares one physical copy of the model through
+    the page cache and memory stays flat as processes are added. Prediction
+    is CPU-bound and runs outside the serving process, so it neither holds
+    its GIL nor blocks the async handlers.
+    """
+
+    def __init__(self, processes: int, root: Text,
+                 keep_versions: int = 2) -> None:
+        self.processes = processes
+        self.root = root
+        self.keep_versions = keep_versions
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def build_engine(self, estimator: Any) -> CompiledForest:
+        """Compile, dump and memory-map an estimator (or a compiled forest)."""
+
+        os.makedirs(self.root, exist_ok=True)
+        compiled = estimator
+        if not isinstance(compiled, CompiledForest):
+            compiled = CompiledForest.from_sklearn(estimator)
+        artifact_dir = os.path.join(self.root, compiled.digest())
+
+        if not os.path.isdir(artifact_dir):
+            # Dump to a scratch directory and rename it, so a reader never
+            # maps half a dump
+            scratch_dir = tempfile.mkdtemp(prefix='.dump-', dir=self.root)
+            compiled.save(scratch_dir)
+            try:
+                os.rename(scratch_dir, artifact_dir)
+            except OSError:
+                # Another server process published the same model first
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+            logger.info(f'Model arrays dumped to {artifact_dir}')
+
+        os.utime(artifact_dir)
+        self._cleanup(keep=artifact_dir)
+
+        return CompiledForest.load(artifact_dir, mmap_mode='r')
+
+    def start(self) -> None:
+        # spawn: forking a server that already runs threads can deadlock the
+        # children
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context('spawn'))
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def predict(self, engine: CompiledForest, X: np.ndarray,
+                min_chunk: int = 256) -> np.ndarray:
+        """Predict in the worker processes, splitting large batches among them.
+        Args:
+            engine {CompiledForest}: forest returned by ``build_engine``
+            X {np.ndarray}: feature matrix
+            min_chunk {int}: smallest slice sent to one worker
+        Returns:
+            np.ndarray: predictions
+        """
+
+        if self._executor is None:
+            raise RuntimeError('InferencePool is not started')
+
+        chunk = max(min_chunk, -(-X.shape[0] // self.processes))
+        futures = [self._executor.submit(_predict_in_worker, engine.path,
+                                         X[start:start + chunk],
+                                         self.keep_versions)
+                   for start in range(0, X.shape[0], chunk)]
+        if not futures:
+            return np.empty(0, dtype=np.float64)
+
+        return np.concatenate([future.result() for future in futures])
+
+    def _cleanup(self, keep: Text) -> None:
+        # Older dumps are removed; mapped files stay readable until unmapped
+        dumps = sorted((os.path.join(self.root, name)
+                        for name in os.listdir(self.root)
+                        if not name.startswith('.')), key=os.path.getmtime)
+        for path in dumps[:-self.keep_versions]:
+            if path != keep:
+                shutil.rmtree(path, ignore_errors=True)
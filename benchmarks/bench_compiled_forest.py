@@ -0,0 +1,82 @@
+"""Benchmark the compiled forest engine against sklearn's predict."""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Text
+import warnings
+
+import joblib
+import numpy as np
+
+# Ajusto el path directamente al directorio src
+project_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.append(project_dir)
+
+from utils.forest import CompiledForest
+
+
+def best_time(fn, X: np.ndarray, min_time: float = 0.2) -> float:
+    """Best wall time of fn(X) over repeated runs lasting at least min_time seconds."""
+
+    times = []
+    start = time.perf_counter()
+    while not times or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - t0)
+
+    return min(times)
+
+
+def bench(model_path: Text, batch_sizes: List[int], random_state: int = 42) -> List[dict]:
+    """Time sklearn and compiled predictions for each batch size.
+    Args:
+        model_path {Text}: path to a fitted RandomForestRegressor joblib file
+        batch_sizes {List[int]}: number of rows per predict call
+        random_state {int}: seed of the synthetic input rows
+    Returns:
+        List[dict]: one result per batch size
+    """
+
+    # Predicting on plain arrays: sklearn warns about the missing feature names
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    model = joblib.load(model_path)
+    compiled = CompiledForest.from_sklearn(model)
+    rng = np.random.default_rng(random_state)
+
+    results = []
+    for n in batch_sizes:
+        X = rng.random((n, compiled.n_features))
+        max_abs_diff = float(np.abs(compiled.predict(X) - model.predict(X)).max())
+        sklearn_s = best_time(model.predict, X)
+        compiled_s = best_time(compiled.predict, X)
+        results.append({
+            'batch_size': n,
+            'sklearn_ms': 1000 * sklearn_s,
+            'compiled_ms': 1000 * compiled_s,
+            'speedup': sklearn_s / compiled_s,
+            'max_abs_diff': max_abs_diff,
+        })
+        print(f'{n:>8} rows  sklearn {1000 * sklearn_s:9.3f} ms  compiled {1000 * compiled_s:9.3f} ms  '
+              f'speedup {sklearn_s / compiled_s:6.2f}x  max|diff| {max_abs_diff:.2e}')
+
+    return results
+
+
+if __name__ == '__main__':
+
+    args_parser = argparse.ArgumentParser()
+    args_parser.add_argument('--model', dest='model', default='models/model.joblib')
+    args_parser.add_argument('--batch-sizes', dest='batch_sizes', default='1,10,100,1000,10000,100000')
+    args_parser.add_argument('--output', dest='output', default=None, help='optional JSON results file')
+    args = args_parser.parse_args()
+
+    results = bench(args.model, [int(n) for n in args.batch_sizes.split(',')])
+
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(results, json_file, indent=4)
@@ -0,0 +1,72 @@
+"""Benchmark the vectorized outlier filter of featurize against the sequential one."""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# Ajusto el path directamente al directorio src
+project_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.append(project_dir)
+
+from stages.featurize import remove_outliers
+
+
+COLUMNS = ['CO_GT_', 'NOx_GT_', 'NO2_GT_', 'PT08_S4_NO2_', 'PT08_S5_O3_', 'T', 'RH', 'AH']
+
+
+def synthetic_frame(n_rows: int, outlier_rate: float = 1e-3, random_state: int = 42) -> pd.DataFrame:
+    """Normal readings with a share of rows pushed far into the tails."""
+
+    rng = np.random.default_rng(random_state)
+    values = rng.standard_normal((n_rows, len(COLUMNS)))
+    outliers = rng.random(values.shape) < outlier_rate
+    values[outliers] *= 10
+    # One contiguous array per column, the layout of a frame read with read_csv
+    return pd.DataFrame({name: np.ascontiguousarray(values[:, j]) for j, name in enumerate(COLUMNS)})
+
+
+def bench(n_rows: int, repeat: int = 3) -> Dict:
+    """Time both modes on the same frame, best of ``repeat`` runs.
+    Args:
+        n_rows {int}: rows of the synthetic frame
+        repeat {int}: runs per mode
+    Returns:
+        Dict: timings and rows kept per mode
+    """
+
+    dataframe = synthetic_frame(n_rows)
+    result = {'rows': n_rows, 'columns': len(COLUMNS)}
+    for mode in ('sequential', 'vectorized'):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            kept = remove_outliers(dataframe, mode)
+            times.append(time.perf_counter() - start)
+        result[mode] = {'seconds': min(times), 'rows_kept': len(kept)}
+        del kept
+
+    result['speedup'] = result['sequential']['seconds'] / result['vectorized']['seconds']
+    print(f"{n_rows:>10} rows  sequential {result['sequential']['seconds']:8.3f} s  "
+          f"vectorized {result['vectorized']['seconds']:8.3f} s  speedup {result['speedup']:5.2f}x")
+    return result
+
+
+if __name__ == '__main__':
+
+    args_parser = argparse.ArgumentParser()
+    args_parser.add_argument('--rows', dest='rows', default='100000,1000000,10000000')
+    args_parser.add_argument('--repeat', dest='repeat', type=int, default=3)
+    args_parser.add_argument('--output', dest='output', default=None, help='optional JSON results file')
+    args = args_parser.parse_args()
+
+    results = [bench(int(n), args.repeat) for n in args.rows.split(',')]
+
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(results, json_file, indent=4)
@@ -0,0 +1,238 @@
+"""Load-test the prediction service and save throughput / latency results as JSON."""
+
+import argparse
+import asyncio
+from contextlib import asynccontextmanager
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Text
+
+import httpx
+import numpy as np
+
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app_dir = os.path.join(project_dir, 'app')
+
+FEATURES = ['NOx_GT_', 'NO2_GT_', 'PT08_S4_NO2_', 'PT08_S5_O3_', 'T', 'RH', 'AH']
+# Typical ranges of the AirQualityUCI readings, used to draw synthetic requests
+FEATURE_RANGES = {
+    'NOx_GT_': (2, 1500), 'NO2_GT_': (2, 340), 'PT08_S4_NO2_': (550, 2800),
+    'PT08_S5_O3_': (220, 2600), 'T': (-2, 44), 'RH': (9, 88), 'AH': (0.18, 2.2),
+}
+
+
+def random_rows(n: int, rng: np.random.Generator) -> List[Dict]:
+    columns = {name: rng.uniform(low, high, n) for name, (low, high) in FEATURE_RANGES.items()}
+    return [{name: float(columns[name][i]) for name in FEATURES} for i in range(n)]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MiB, read from /proc."""
+
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def process_tree(pid: int) -> List[int]:
+    """The process and all its descendants (uvicorn workers, inference pool)."""
+
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                parent = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def summarize(name: Text, latencies: List[float], errors: int, rows: int, duration: float) -> Dict:
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else (0, 0, 0)
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'rows': rows,
+        'duration_s': duration,
+        'requests_per_s': len(latencies) / duration if duration else 0.0,
+        'rows_per_s': rows / duration if duration else 0.0,
+        'latency_ms': {'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+                       'mean': float(latencies_ms.mean()) if len(latencies_ms) else 0.0},
+    }
+
+
+async def run_requests(client: httpx.AsyncClient, make_request, n_requests: int, concurrency: int):
+    """Send n_requests with at most ``concurrency`` in flight; returns latencies and error count."""
+
+    latencies, errors = [], 0
+    counter = iter(range(n_requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run_scenarios(client: httpx.AsyncClient, args) -> List[Dict]:
+    rng = np.random.default_rng(args.seed)
+    rows = random_rows(args.requests, rng)
+    batch = random_rows(args.batch_size, rng)
+    batch_body = {name: [row[name] for row in batch] for name in FEATURES}
+
+    async def single(client, i):
+        return await client.post('/predict', json=rows[i])
+
+    async def batched(client, i):
+        return await client.post('/predict/batch', json=batch_body)
+
+    # Warmup so first-call costs are not measured
+    for i in range(min(20, args.requests)):
+        await single(client, i)
+
+    results = []
+    for scenario in args.scenarios.split(','):
+        if scenario == 'single':
+            latencies, errors, duration = await run_requests(client, single, args.requests, 1)
+            results.append(summarize('single', latencies, errors, len(latencies), duration))
+        elif scenario == 'concurrent':
+            latencies, errors, duration = await run_requests(client, single, args.requests, args.concurrency)
+            results.append(summarize(f'concurrent_{args.concurrency}', latencies, errors, len(latencies),
+                                     duration))
+        elif scenario == 'batch':
+            latencies, errors, duration = await run_requests(client, batched, args.batch_requests, 1)
+            results.append(summarize(f'batch_{args.batch_size}', latencies, errors,
+                                     len(latencies) * args.batch_size, duration))
+        else:
+            raise ValueError(f'Unknown scenario {scenario}')
+        print(json.dumps(results[-1]))
+
+    return results
+
+
+@asynccontextmanager
+async def in_process_client():
+    """ASGI client around the app imported in this process, lifespan included."""
+
+    sys.path.append(app_dir)
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            yield client, [os.getpid()]
+
+
+@asynccontextmanager
+async def uvicorn_client(port: int, workers: int):
+    """Start uvicorn on localhost in a subprocess and yield a client to it."""
+
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', app_dir, '--host', '127.0.0.1',
+         '--port', str(port), '--workers', str(workers), '--log-level', 'warning'])
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            for _ in range(600):
+                try:
+                    if (await client.get('/')).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError('uvicorn did not start')
+            yield client, process_tree(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit() -> Optional[Text]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=project_dir, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args) -> Dict:
+    if args.server == 'uvicorn':
+        client_context = uvicorn_client(args.port, args.workers)
+    else:
+        client_context = in_process_client()
+
+    async with client_context as (client, pids):
+        results = await run_scenarios(client, args)
+        metrics = (await client.get('/metrics')).text
+        model_version = next((line.split('"')[1] for line in metrics.splitlines()
+                              if line.startswith('model_info{')), None)
+        rss = {str(pid): rss_mb(pid) for pid in process_tree(pids[0])} if args.server == 'uvicorn' \
+            else {str(pid): rss_mb(pid) for pid in pids}
+
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'model_version': model_version,
+        'server': args.server,
+        'workers': args.workers if args.server == 'uvicorn' else 1,
+        'settings': {name: value for name, value in os.environ.items()
+                     if name.startswith(('MODEL_', 'MICROBATCH_', 'PREDICTION_CACHE_', 'INFERENCE_',
+                                         'USE_COMPILED', 'COMPILED_', 'MAX_BATCH_', 'STREAM_'))},
+        'rss_mb_per_process': rss,
+        'scenarios': results,
+    }
+
+
+if __name__ == '__main__':
+
+    args_parser = argparse.ArgumentParser()
+    args_parser.add_argument('--server', choices=['inprocess', 'uvicorn'], default='inprocess')
+    args_parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    args_parser.add_argument('--port', type=int, default=8765)
+    args_parser.add_argument('--scenarios', default='single,batch,concurrent')
+    args_parser.add_argument('--requests', type=int, default=2000)
+    args_parser.add_argument('--concurrency', type=int, default=32)
+    args_parser.add_argument('--batch-size', dest='batch_size', type=int, default=256)
+    args_parser.add_argument('--batch-requests', dest='batch_requests', type=int, default=50)
+    args_parser.add_argument('--seed', type=int, default=42)
+    args_parser.add_argument('--output-dir', dest='output_dir', default='reports/benchmarks')
+    args = args_parser.parse_args()
+
+    report = asyncio.run(main(args))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f'load_test_{datetime.datetime.now():%Y%m%d_%H%M%S}.json')
+    with open(output_path, 'w') as json_file:
+        json.dump(report, json_file, indent=4)
+    print(f'Results saved to {output_path}')
@@ -1,6 +1,14 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import glob
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
 import pandas as pd
-from typing import Text
+from typing import Dict, List, Optional, Text, Union
 import yaml
 import os
 import sys
@@ -12,6 +20,485 @@ sys.path.append(project_dir)
 
 # Importamos directamente desde utils
 from utils.logs import get_logger
+from utils.storage import (append_table, read_table, storage_format,
+                           table_columns, table_path, write_table)
+
+
+# Se definen las columnas válidas que se esperan en el dataset
+VALID_COLUMNS = [
+    'Date', 'Time', 'CO(GT)', 'PT08.S1(CO)', 'NMHC(GT)',
+    'C6H6(GT)', 'PT08.S2(NMHC)', 'NOx(GT)', 'PT08.S3(NOx)',
+    'NO2(GT)', 'PT08.S4(NO2)', 'PT08.S5(O3)', 'T', 'RH', 'AH'
+]
+
+# Formato de fecha y hora del archivo original, p. ej. '10/03/2004' y
+# '18.00.00'
+DATETIME_FORMAT = '%d/%m/%Y %H.%M.%S'
+DATETIME_COLUMN = 'Datetime'
+
+# Columna con el identificador de estación al cargar varios archivos
+STATION_COLUMN = 'Station'
+
+
+def clean_column_name(column: Text) -> Text:
+    """Replace '(', ')' and '.' in a column name by '_'."""
+
+    return column.replace('(', '_').replace(')', '_').replace('.', '_')
+
+
+def read_options(dataset_csv: Text, usecols: Optional[List[Text]] = None,
+                 sensor_dtype: Text = 'float64',
+                 parse_datetime: bool = False) -> Dict:
+    """Get the read_csv arguments of the raw file: separators, columns, types.
+
+    Only the requested columns are parsed, straight into ``sensor_dtype``
+    for the sensors instead of inferring each column's type.
+    Args:
+        dataset_csv {Text}: raw semicolon-separated, comma-decimal CSV
+        usecols {List[Text]}: cleaned names of the columns to keep, None for
+            all valid ones
+        sensor_dtype {Text}: type of the sensor columns, e.g. 'float32'
+        parse_datetime {bool}: Date and Time are read even if not in usecols
+    Returns:
+        Dict: keyword arguments of pd.read_csv
+    """
+
+    header = pd.read_csv(dataset_csv, sep=';', decimal=',', nrows=0).columns
+    available = {clean_column_name(col): col
+                 for col in header if col in VALID_COLUMNS}
+
+    wanted = list(usecols) if usecols else list(available)
+    if parse_datetime:
+        wanted += [col for col in ('Date', 'Time') if col not in wanted]
+    unknown = [col for col in wanted if col not in available]
+    if unknown:
+        raise ValueError(f'Unknown columns in data_load.usecols: {unknown}')
+
+    columns = [available[col] for col in wanted]
+    return {
+        'sep': ';',
+        'decimal': ',',
+        'usecols': columns,
+        'dtype': {col: sensor_dtype
+                  for col in columns if col not in ('Date', 'Time')},
+    }
+
+
+def clean_raw_data(raw_data: pd.DataFrame,
+                   parse_datetime: bool = False) -> pd.DataFrame:
+    """Rename the columns, keep the valid ones and drop all-NaN rows.
+    Args:
+        raw_data {pd.DataFrame}: raw dataset, or one chunk of it
+        parse_datetime {bool}: merge Date and Time into a datetime64 index
+    Returns:
+        pd.DataFrame: cleaned data
+    """
+
+    # Cambiar también los nombres de las columnas en el DataFrame
+    raw_data.columns = [clean_column_name(col) for col in raw_data.columns]
+
+    # Conservar solo las columnas válidas que también existen en el DataFrame
+    valid_columns = [clean_column_name(col) for col in VALID_COLUMNS]
+    raw_data = raw_data[[col for col in valid_columns
+                         if col in raw_data.columns]]
+
+    # Se eliminan filas donde todos los campos relevantes son NaN
+    raw_data = raw_data.dropna(how='all')
+
+    if parse_datetime:
+        # Un único parseo con formato explícito, sin inferir el formato fila
+        # por fila
+        datetime = pd.to_datetime(raw_data['Date'] + ' ' + raw_data['Time'],
+                                  format=DATETIME_FORMAT)
+        raw_data = raw_data.drop(columns=['Date', 'Time']).set_index(
+            datetime.rename(DATETIME_COLUMN))
+
+    return raw_data
+
+
+def to_table(cleaned: pd.DataFrame) -> pd.DataFrame:
+    """Get the cleaned data as written: the datetime index first, if any."""
+
+    if cleaned.index.name == DATETIME_COLUMN:
+        return cleaned.reset_index()
+    return cleaned
+
+
+def data_load_chunked(dataset_csv: Text, output_csv: Text, chunksize: int,
+                      storage: Optional[Dict] = None,
+                      options: Optional[Dict] = None,
+                      parse_datetime: bool = False) -> int:
+    """Clean the raw CSV chunk by chunk, appending each one to the output.
+
+    Peak memory depends on ``chunksize``, not on the file size. Every chunk
+    is parsed with the explicit types of ``read_options``, as the single
+    read is, so the output is the same. Only CSV storage can be appended to
+    chunk by chunk; binary formats would need every chunk in memory, so they
+    are refused rather than silently losing the memory bound.
+    Args:
+        dataset_csv {Text}: raw semicolon-separated, comma-decimal CSV
+        output_csv {Text}: cleaned CSV
+        chunksize {int}: rows per chunk
+        storage {Dict}: storage config section
+        options {Dict}: read_csv arguments from read_options, None for its
+            defaults
+        parse_datetime {bool}: merge Date and Time into a datetime64 column
+    Returns:
+        int: rows written
+    """
+
+    fmt = storage_format(storage)
+    if fmt != 'csv':
+        raise ValueError(f'data_load.chunksize needs storage.format csv, '
+                         f'got {fmt}: {fmt} tables cannot be appended to '
+                         f'chunk by chunk')
+    options = options or read_options(dataset_csv,
+                                      parse_datetime=parse_datetime)
+
+    rows = 0
+    chunks = pd.read_csv(dataset_csv, chunksize=chunksize, **options)
+    for i, chunk in enumerate(chunks):
+        chunk = to_table(clean_raw_data(chunk, parse_datetime))
+        chunk.to_csv(output_csv, index=False, mode='w' if i == 0 else 'a',
+                     header=i == 0)
+        rows += len(chunk)
+
+    return rows
+
+
+def raw_files(dataset_csv: Union[Text, List[Text]]) -> List[Text]:
+    """Expand data_load.dataset_csv: a path, a glob pattern or a list of them.
+    Args:
+        dataset_csv {Text or List[Text]}: e.g. 'data/raw/stations/*.csv'
+    Returns:
+        List[Text]: raw files, sorted within each pattern
+    """
+
+    if isinstance(dataset_csv, str):
+        patterns = [dataset_csv]
+    else:
+        patterns = list(dataset_csv)
+    files = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        if not matches:
+            raise FileNotFoundError(f'No raw file matches {pattern}')
+        files += matches
+
+    return files
+
+
+def station_id(path: Text) -> Text:
+    """Get the station id of a raw file: its name without extension."""
+
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def load_station(path: Text, usecols: Optional[List[Text]] = None,
+                 sensor_dtype: Text = 'float64', parse_datetime: bool = False,
+                 chunksize: Optional[int] = None) -> pd.DataFrame:
+    """Parse and clean the raw file of one station.
+
+    Runs in a worker process. With ``chunksize`` the raw file is parsed in
+    chunks and only the cleaned rows are kept, so the memory of a worker
+    does not depend on the size of its raw file. Rows are tagged with the
+    station id.
+    Args:
+        path {Text}: raw file of the station
+        usecols {List[Text]}: see read_options
+        sensor_dtype {Text}: see read_options
+        parse_datetime {bool}: merge Date and Time into a datetime64 index
+        chunksize {int}: rows per chunk, None reads the file at once
+    Returns:
+        pd.DataFrame: cleaned data with the station column first
+    """
+
+    options = read_options(path, usecols, sensor_dtype, parse_datetime)
+    if chunksize:
+        chunks = pd.read_csv(path, chunksize=chunksize, **options)
+        cleaned = pd.concat([clean_raw_data(chunk, parse_datetime)
+                             for chunk in chunks])
+    else:
+        cleaned = clean_raw_data(pd.read_csv(path, **options),
+                                 parse_datetime)
+
+    cleaned.insert(0, STATION_COLUMN, station_id(path))
+    return cleaned
+
+
+def data_load_stations(files: List[Text], workers: Optional[int] = None,
+                       usecols: Optional[List[Text]] = None,
+                       sensor_dtype: Text = 'float64',
+                       parse_datetime: bool = False,
+                       chunksize: Optional[int] = None) -> pd.DataFrame:
+    """Load the raw files of several stations in parallel, in time order.
+
+    Each file is parsed and cleaned by one worker process of a pool of
+    ``workers`` processes; the merged rows are sorted by date and time,
+    then by station.
+    Args:
+        files {List[Text]}: raw files, one per station
+        workers {int}: worker processes, None for one per core
+        usecols, sensor_dtype, parse_datetime, chunksize: see load_station
+    Returns:
+        pd.DataFrame: cleaned data of every station
+    """
+
+    load = partial(load_station, usecols=usecols, sensor_dtype=sensor_dtype,
+                   parse_datetime=parse_datetime, chunksize=chunksize)
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers == 1:
+        frames = [load(path) for path in files]
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=context) as executor:
+            frames = list(executor.map(load, files))
+
+    merged = pd.concat(frames)
+    merged[STATION_COLUMN] = merged[STATION_COLUMN].astype('category')
+
+    # Orden temporal entre estaciones (el formato dd/mm/aaaa no se puede
+    # ordenar como texto)
+    if parse_datetime:
+        times = merged.index.to_numpy()
+    else:
+        times = pd.to_datetime(merged['Date'] + ' ' + merged['Time'],
+                               format=DATETIME_FORMAT,
+                               errors='coerce').to_numpy()
+    keys = pd.DataFrame({'time': times,
+                         'station': merged[STATION_COLUMN].to_numpy()})
+    return merged.iloc[keys.sort_values(['time', 'station']).index]
+
+
+def fingerprint(config: Dict, header: bytes) -> Text:
+    """Hash what shapes the cleaned data: raw header, valid columns, params.
+    Args:
+        config {Dict}: full config
+        header {bytes}: first line of the raw file
+    Returns:
+        Text: hex digest
+    """
+
+    # Parámetros que no cambian el resultado, solo cómo se obtiene
+    ignored = ('incremental', 'watermark_path', 'chunksize', 'workers')
+    state = {
+        'header': header.decode('utf-8', errors='replace'),
+        'valid_columns': VALID_COLUMNS,
+        'data_load': {key: value for key, value in config['data_load'].items()
+                      if key not in ignored},
+        'storage': config.get('storage'),
+    }
+    encoded = json.dumps(state, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def watermark_file(data_load_config: Dict) -> Text:
+    """Get the watermark path: data_load.watermark_path or next to the data."""
+
+    cleaned = data_load_config['dataset_csv_cleaned']
+    return (data_load_config.get('watermark_path')
+            or os.path.splitext(cleaned)[0] + '.watermark.json')
+
+
+def read_watermark(path: Text) -> Optional[Dict]:
+    """Read a watermark, None if there is none."""
+
+    if not os.path.exists(path):
+        return None
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def write_watermark(path: Text, watermark: Dict) -> None:
+    """Write a watermark atomically: an interrupted run keeps the last one."""
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as json_file:
+        json.dump(watermark, json_file, indent=4)
+    os.replace(tmp_path, path)
+
+
+def complete_lines_end(data: bytes) -> int:
+    """Get the length of the complete lines of ``data``.
+
+    A partly written last line waits for the next run.
+    """
+
+    return data.rfind(b'\n') + 1
+
+
+def last_line_end(path: Text, size: int, block_size: int = 1 << 16) -> int:
+    """Get the end of the last complete line in the first ``size`` bytes.
+
+    The file is scanned backwards from ``size`` one block at a time, so only
+    the partly written last line is read, not the whole file.
+    """
+
+    with open(path, 'rb') as raw_file:
+        end = size
+        while end > 0:
+            start = max(0, end - block_size)
+            raw_file.seek(start)
+            newline = raw_file.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+class _Prefix(io.RawIOBase):
+    """Read-only stream over the first ``size`` bytes of a binary file."""
+
+    def __init__(self, raw_file, size: int) -> None:
+        self._raw_file = raw_file
+        self._left = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._raw_file.readinto(memoryview(buffer)[:self._left])
+        self._left -= n
+        return n
+
+    def close(self) -> None:
+        self._raw_file.close()
+        super().close()
+
+
+def open_prefix(path: Text, size: int) -> io.BufferedReader:
+    """Open the first ``size`` bytes of a file for read_csv.
+
+    E.g. its complete lines.
+    """
+
+    return io.BufferedReader(_Prefix(open(path, 'rb'), size))
+
+
+def reading_times(table: pd.DataFrame) -> Optional[pd.Series]:
+    """Get the date and time of each row, None without date and time."""
+
+    if DATETIME_COLUMN in table.columns:
+        return pd.to_datetime(table[DATETIME_COLUMN], format='ISO8601')
+    if 'Date' in table.columns and 'Time' in table.columns:
+        return pd.to_datetime(table['Date'] + ' ' + table['Time'],
+                              format=DATETIME_FORMAT, errors='coerce')
+    return None
+
+
+def last_reading(table: pd.DataFrame) -> Optional[Text]:
+    """Get the latest date and time of a table as ISO text, None if unknown."""
+
+    times = reading_times(table)
+    latest = times.max() if times is not None else pd.NaT
+    return None if pd.isna(latest) else latest.isoformat()
+
+
+def data_load_incremental(config: Dict, logger: logging.Logger) -> None:
+    """Append the readings added to the raw file since the last run.
+
+    The watermark stores the byte offset of the raw file processed so far,
+    the latest date and time loaded and a fingerprint of the raw header and
+    params. Only the bytes after the offset are parsed, and rows not later
+    than the watermark are skipped, so a row is never loaded twice. A
+    missing watermark or cleaned table, a changed fingerprint or a raw file
+    shorter than the offset (rewritten) trigger a full rebuild instead.
+    Args:
+        config {Dict}: full config
+        logger: stage logger
+    """
+
+    data_load_config = config['data_load']
+    dataset_csv = data_load_config['dataset_csv']
+    output = data_load_config['dataset_csv_cleaned']
+    storage = config.get('storage')
+    parse_datetime = data_load_config.get('parse_datetime', False)
+    watermark_path = watermark_file(data_load_config)
+
+    if not isinstance(dataset_csv, str) or glob.has_magic(dataset_csv):
+        logger.warning('Incremental mode needs a single raw file, '
+                       'loading every station')
+        load_full(config, logger)
+        return
+
+    # Tamaño tomado antes de leer: lo que se escriba después queda para la
+    # próxima ejecución
+    size = os.path.getsize(dataset_csv)
+    with open(dataset_csv, 'rb') as raw_file:
+        header = raw_file.readline()
+    current = fingerprint(config, header)
+    watermark = read_watermark(watermark_path)
+
+    reason = None
+    if watermark is None:
+        reason = 'no watermark'
+    elif watermark['fingerprint'] != current:
+        reason = 'raw schema or params changed'
+    elif not os.path.exists(table_path(output, storage)):
+        reason = 'cleaned data missing'
+    elif size < watermark['offset']:
+        reason = 'raw file is shorter than the watermark'
+
+    if reason is not None:
+        logger.info(f'Full rebuild: {reason}')
+        # Solo se procesan las líneas completas; una línea a medio escribir
+        # queda para la próxima ejecución
+        offset = last_line_end(dataset_csv, size)
+        with open_prefix(dataset_csv, offset) as raw_source:
+            load_full(config, logger, raw_source)
+        # Solo se releen las columnas de fecha y hora (o una cualquiera para
+        # contar filas)
+        columns = table_columns(output, storage)
+        time_columns = [col for col in columns
+                        if col in ('Date', 'Time', DATETIME_COLUMN)]
+        cleaned = read_table(output, storage,
+                             columns=time_columns or columns[:1])
+        write_watermark(watermark_path, {
+            'fingerprint': current,
+            'offset': offset,
+            'last_datetime': last_reading(cleaned),
+            'rows': len(cleaned),
+        })
+        return
+
+    # Solo se lee la cola nueva del archivo, hasta la última línea completa
+    with open(dataset_csv, 'rb') as raw_file:
+        raw_file.seek(watermark['offset'])
+        tail = raw_file.read(size - watermark['offset'])
+    tail = tail[:complete_lines_end(tail)]
+    if not tail.strip():
+        logger.info('No new readings')
+        return
+
+    options = read_options(dataset_csv, data_load_config.get('usecols'),
+                           data_load_config.get('sensor_dtype', 'float64'),
+                           parse_datetime)
+    raw_rows = pd.read_csv(io.BytesIO(header + tail), **options)
+    new_rows = to_table(clean_raw_data(raw_rows, parse_datetime))
+
+    # Se descartan filas ya cargadas (p. ej. un archivo reescrito con las
+    # mismas lecturas al final)
+    times = reading_times(new_rows)
+    if watermark['last_datetime'] is not None and times is not None:
+        loaded = times <= pd.Timestamp(watermark['last_datetime'])
+        new_rows = new_rows[~loaded]
+
+    if len(new_rows):
+        append_table(new_rows, output, storage)
+    logger.info(
+        f'Appended {len(new_rows)} new rows from {len(tail)} bytes')
+
+    write_watermark(watermark_path, {
+        'fingerprint': current,
+        'offset': watermark['offset'] + len(tail),
+        'last_datetime': (last_reading(new_rows)
+                          or watermark['last_datetime']),
+        'rows': watermark['rows'] + len(new_rows),
+    })
 
 
 def data_load(config_path: Text) -> None:
@@ -25,37 +512,75 @@ def data_load(config_path: Text) -> None:
 
     logger = get_logger('DATA_LOAD', log_level=config['base']['log_level'])
 
-    logger.info('Get dataset')
-    
-    raw_data = pd.read_csv(config['data_load']['dataset_csv'], sep=';', decimal=',')
-    
-        # Se definen las columnas válidas que se esperan en el dataset
-    valid_columns = [
-        'Date', 'Time', 'CO(GT)', 'PT08.S1(CO)', 'NMHC(GT)', 
-        'C6H6(GT)', 'PT08.S2(NMHC)', 'NOx(GT)', 'PT08.S3(NOx)', 
-        'NO2(GT)', 'PT08.S4(NO2)', 'PT08.S5(O3)', 'T', 'RH', 'AH'
-    ]
-   
-    # Reemplazar los caracteres '(', ')', '.' por '_'
-    valid_columns = [col.replace('(', '_').replace(')', '_').replace('.', '_') for col in valid_columns]
+    # Modo incremental: solo se agregan las lecturas nuevas del archivo
+    # original
+    if config['data_load'].get('incremental', False):
+        data_load_incremental(config, logger)
+    else:
+        load_full(config, logger)
 
-    # Cambiar también los nombres de las columnas en el DataFrame
-    raw_data.columns = [col.replace('(', '_').replace(')', '_').replace('.', '_') for col in raw_data.columns]
 
-    # Conservar solo las columnas válidas que también existen en el DataFrame
-    raw_data = raw_data[valid_columns]
+def load_full(config: Dict, logger: logging.Logger,
+              raw_source: Optional[io.BufferedReader] = None) -> None:
+    """Clean the whole raw dataset and write it, replacing the last output.
+    Args:
+        config {Dict}: full config
+        logger: stage logger
+        raw_source: stream read instead of the single raw file, e.g. its
+            complete lines
+    """
+
+    # Solo se leen las columnas pedidas, con tipos explícitos
+    data_load_config = config['data_load']
+    parse_datetime = data_load_config.get('parse_datetime', False)
+    sensor_dtype = data_load_config.get('sensor_dtype', 'float64')
+    output = data_load_config['dataset_csv_cleaned']
+    if raw_source is None:
+        raw_source = data_load_config['dataset_csv']
+
+    # Varias estaciones: una lista o un patrón glob de archivos
+    dataset_csv = data_load_config['dataset_csv']
+    if not isinstance(dataset_csv, str) or glob.has_magic(dataset_csv):
+        files = raw_files(dataset_csv)
+        logger.info(f'Get dataset of {len(files)} stations')
+        raw_data = data_load_stations(files, data_load_config.get('workers'),
+                                      data_load_config.get('usecols'),
+                                      sensor_dtype, parse_datetime,
+                                      data_load_config.get('chunksize'))
+        logger.info('Save raw data cleaned')
+        write_table(to_table(raw_data), output, config.get('storage'))
+        return
+
+    options = read_options(data_load_config['dataset_csv'],
+                           data_load_config.get('usecols'), sensor_dtype,
+                           parse_datetime)
 
+    # Modo por bloques: memoria acotada sin importar el tamaño del archivo
+    chunksize = data_load_config.get('chunksize')
+    if chunksize:
+        logger.info(f'Clean dataset in chunks of {chunksize} rows')
+        rows = data_load_chunked(raw_source, output, chunksize,
+                                 config.get('storage'), options,
+                                 parse_datetime)
+        logger.info(f'Raw data cleaned saved, {rows} rows')
+        return
+
+    logger.info('Get dataset')
     
-    # Se eliminan filas donde todos los campos relevantes son NaN
-    raw_data.dropna(how='all', inplace=True)
+    raw_data = pd.read_csv(raw_source, **options)
+
+    raw_data = clean_raw_data(raw_data, parse_datetime)
     
-    #Se visualiza que figuran dos columnas extra (nulas) al extremo derecho de la matriz tabular que hay que remover
+    #Se visualiza que figuran dos columnas extra (nulas) al extremo derecho
+    #de la matriz tabular que hay que remover
     #raw_data = raw_data.iloc[:, :-2]
-    #Procediendo a eliminar filas del dataset se asegura tener el dataset limpios de filas y columnas llenas de valores nulos y lograr la coincidencia de dimensión del dataset según la bibliografía.
+    #Procediendo a eliminar filas del dataset se asegura tener el dataset
+    #limpios de filas y columnas llenas de valores nulos y lograr la
+    #coincidencia de dimensión del dataset según la bibliografía.
     #raw_data = raw_data.head(9357)
 
     logger.info('Save raw data cleaned')
-    raw_data.to_csv(config['data_load']['dataset_csv_cleaned'], index=False)
+    write_table(to_table(raw_data), output, config.get('storage'))
 
 
 if __name__ == '__main__':
@@ -13,7 +13,10 @@ project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_dir)
 
 # Importamos directamente desde utils
+from stages.featurize import Featurizer
 from utils.logs import get_logger
+from utils.storage import read_table, write_matrix, write_table
+from utils.transforms import FeatureTransform
 
 
 def data_split(config_path: Text) -> None:
@@ -30,8 +33,9 @@ def data_split(config_path: Text) -> None:
 
     logger.info('Get featurize datasets')
     
-    X = pd.read_csv(config['featurize']['X_scaled_csv_path'])
-    y = pd.read_csv(config['featurize']['y_csv_path'])
+    storage = config.get('storage')
+    X = read_table(config['featurize']['X_scaled_csv_path'], storage)
+    y = read_table(config['featurize']['y_csv_path'], storage)
     
     logger.info('Splitting data')    
     # División en conjuntos de entrenamiento y prueba
@@ -64,13 +68,28 @@ def data_split(config_path: Text) -> None:
     y_train_csv_path = config['data_split']['y_train_csv_path']
     y_test_csv_path = config['data_split']['y_test_csv_path']
     
-    X_train.to_csv(X_train_csv_path, index=False)
-    X_test.to_csv(X_test_csv_path, index=False)
-    X_train_scaled.to_csv(X_train_scaled_csv_path, index=False)
-    X_test_scaled.to_csv(X_test_scaled_csv_path, index=False)
-    y_train.to_csv(y_train_csv_path, index=False)
-    y_test.to_csv(y_test_csv_path, index=False)
+    write_table(X_train, X_train_csv_path, storage)
+    write_table(X_test, X_test_csv_path, storage)
+    write_table(X_train_scaled, X_train_scaled_csv_path, storage)
+    write_table(X_test_scaled, X_test_scaled_csv_path, storage)
+    write_table(y_train, y_train_csv_path, storage)
+    write_table(y_test, y_test_csv_path, storage)
+
+    # Entradas del modelo como matrices .npy que train, evaluate y export mapean en memoria
+    if (storage or {}).get('matrices'):
+        matrix_dtype = storage.get('matrix_dtype', 'float64')
+        write_matrix(X_train_scaled, X_train_scaled_csv_path, matrix_dtype)
+        write_matrix(X_test_scaled, X_test_scaled_csv_path, matrix_dtype)
+        write_matrix(y_train, y_train_csv_path)
+        write_matrix(y_test, y_test_csv_path)
     
+    logger.info('Save fitted feature transform')
+    # Box-Cox de featurize + MinMaxScaler en un solo artefacto junto al modelo, para servir
+    featurizer = Featurizer.load(config['featurize']['featurizer_path'])
+    transform = FeatureTransform.fit(list(X_train.columns), featurizer.boxcox_lambdas, min_max_scaler,
+                                     featurizer.sentinel, featurizer.fill_values)
+    transform.save(config['data_split']['transform_path'])
+
     logger.info('Data split completed')
     
 
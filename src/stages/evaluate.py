@@ -17,7 +17,9 @@ project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_dir)
 
 # Importamos directamente desde utils
+from utils.forest import CompiledForest
 from utils.logs import get_logger
+from utils.storage import load_matrix
 
 
 def evaluate(config_path: Text) -> None:
@@ -34,14 +36,15 @@ def evaluate(config_path: Text) -> None:
 
     logger.info('Get data to evaluate')
         
-    X_train_scaled = pd.read_csv(config['data_split']['X_train_scaled_csv_path'])
-    X_test_scaled = pd.read_csv(config['data_split']['X_test_scaled_csv_path'])
-    y_train = pd.read_csv(config['data_split']['y_train_csv_path'])
-    y_test = pd.read_csv(config['data_split']['y_test_csv_path'])
+    storage = config.get('storage')
+    X_train_scaled = load_matrix(config['data_split']['X_train_scaled_csv_path'], storage)
+    X_test_scaled = load_matrix(config['data_split']['X_test_scaled_csv_path'], storage)
+    y_train = load_matrix(config['data_split']['y_train_csv_path'], storage)
+    y_test = load_matrix(config['data_split']['y_test_csv_path'], storage)
         
     # Convertir y_train y y_test en matrices unidimensionales
-    y_train = y_train.values.ravel()
-    y_test = y_test.values.ravel()
+    y_train = np.asarray(y_train).ravel()
+    y_test = np.asarray(y_test).ravel()
     
     logger.info('Load model')
     
@@ -51,9 +54,16 @@ def evaluate(config_path: Text) -> None:
     logger.info('Evaluating with model')  
     # Entrenar el modelo
     model.fit(X_train_scaled, y_train)
+
+    # Opcionalmente se predice con el bosque compilado en tablas NumPy (mismo resultado)
+    predictor = model
+    if config['evaluate'].get('use_compiled_forest', False):
+        logger.info('Using compiled forest for predictions')
+        predictor = CompiledForest.from_sklearn(model)
+
     # Predecir los valores para los conjuntos de entrenamiento y prueba
-    predicted_train_values = model.predict(X_train_scaled)
-    predicted_test_values = model.predict(X_test_scaled)
+    predicted_train_values = predictor.predict(X_train_scaled)
+    predicted_test_values = predictor.predict(X_test_scaled)
     
     # Crear un DataFrame con las métricas de evaluación
     scores = pd.DataFrame({
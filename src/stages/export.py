@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Optional, Text
+
+import joblib
+import numpy as np
+import yaml
+from sklearn.metrics import mean_squared_error, r2_score
+
+# Ajusto el path directamente al directorio src
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_dir)
+
+# Importamos directamente desde utils
+from utils.forest import CompiledForest
+from utils.logs import get_logger
+from utils.storage import load_matrix
+
+
+def scores(y_true: np.ndarray, y_pred: np.ndarray) -> Dict:
+    """Get the RMSE and R2 of a set of predictions.
+    Args:
+        y_true {np.ndarray}: true values
+        y_pred {np.ndarray}: predicted values
+    Returns:
+        Dict: 'RMSE' and 'R2'
+    """
+
+    return {'RMSE': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+            'R2': float(r2_score(y_true, y_pred))}
+
+
+def oob_mask(model: Any, n_samples: int) -> Optional[np.ndarray]:
+    """Get the training samples each tree of a bootstrapped forest did not see.
+
+    The bootstrap samples are drawn again from each tree's random state, as
+    sklearn does for ``oob_score``.
+    Args:
+        model: fitted estimator
+        n_samples {int}: rows of the training set
+    Returns:
+        np.ndarray: boolean (n_trees, n_samples), None if the model is not a bootstrapped forest
+    """
+
+    if not getattr(model, 'bootstrap', False) or not hasattr(model, 'estimators_'):
+        return None
+    from sklearn.ensemble._forest import _generate_unsampled_indices, _get_n_samples_bootstrap
+
+    n_samples_bootstrap = _get_n_samples_bootstrap(n_samples, model.max_samples)
+    mask = np.zeros((len(model.estimators_), n_samples), dtype=bool)
+    for i, tree in enumerate(model.estimators_):
+        mask[i, _generate_unsampled_indices(tree.random_state, n_samples, n_samples_bootstrap)] = True
+
+    return mask
+
+
+def oob_rmse(forest: CompiledForest, X: np.ndarray, y: np.ndarray, mask: np.ndarray) -> float:
+    """Get the out-of-bag RMSE: each sample averaged over the trees that did not see it.
+    Args:
+        forest {CompiledForest}: compiled model, possibly pruned
+        X {np.ndarray}: training features
+        y {np.ndarray}: training target
+        mask {np.ndarray}: output of oob_mask
+    Returns:
+        float: RMSE over the samples left out by at least one tree
+    """
+
+    counts = mask.sum(axis=0)
+    left_out = counts > 0
+    predictions = (forest.predict_trees(X) * mask).sum(axis=0)[left_out] / counts[left_out]
+
+    return float(np.sqrt(mean_squared_error(y[left_out], predictions)))
+
+
+def export(config_path: Text) -> None:
+    """Export the trained model as a compact serving artifact.
+    Args:
+        config_path {Text}: path to config
+    """
+
+    with open(config_path) as conf_file:
+        config = yaml.safe_load(conf_file)
+
+    # Configurando el logger
+    logger = get_logger('EXPORT', log_level=config['base']['log_level'])
+    export_config = config['export']
+
+    logger.info('Load model')
+
+    model_path = config['train']['model_path']
+    start = time.perf_counter()
+    model = joblib.load(model_path)
+    original_load_s = time.perf_counter() - start
+
+    X_test_scaled = load_matrix(config['data_split']['X_test_scaled_csv_path'], config.get('storage'))
+    y_test = np.asarray(load_matrix(config['data_split']['y_test_csv_path'], config.get('storage'))).ravel()
+    original_scores = scores(y_test, model.predict(X_test_scaled))
+
+    # El bosque compilado recibe la matriz en el orden de entrenamiento, como en la API
+    X_test_scaled = np.asarray(X_test_scaled)
+
+    logger.info('Compile model')
+
+    forest = CompiledForest.from_sklearn(model)
+    if export_config.get('float32', True):
+        # Umbrales redondeados hacia abajo: el recorrido de los árboles no cambia
+        forest = forest.compact()
+
+    # Poda por profundidad: la menor profundidad dentro del margen de error se elige con el error
+    # out-of-bag del conjunto de entrenamiento; el de prueba solo se mide una vez, al final
+    max_error_increase = export_config.get('max_error_increase', 0.0)
+    depth = forest.max_depth
+    pruning = None
+    if max_error_increase > 0:
+        X_train_scaled = np.asarray(load_matrix(config['data_split']['X_train_scaled_csv_path'],
+                                                config.get('storage')))
+        y_train = np.asarray(load_matrix(config['data_split']['y_train_csv_path'], config.get('storage'))).ravel()
+        mask = oob_mask(model, len(y_train))
+        if mask is None:
+            logger.warning('Model is not a bootstrapped forest, pruning skipped')
+        else:
+            oob_original = oob_rmse(forest, X_train_scaled, y_train, mask)
+            budget = oob_original * (1 + max_error_increase)
+            logger.info(f'Prune within out-of-bag RMSE <= {budget:.4f}')
+            oob_pruned = oob_original
+            while depth > 1:
+                candidate = oob_rmse(forest.prune(depth - 1), X_train_scaled, y_train, mask)
+                if candidate > budget:
+                    break
+                depth, oob_pruned = depth - 1, candidate
+            pruning = {'oob_RMSE_original': oob_original, 'oob_RMSE_compact': oob_pruned,
+                       'oob_rmse_increase': oob_pruned / oob_original - 1}
+    compact = forest.prune(depth)
+
+    logger.info('Save compact model')
+
+    compact_path = export_config['model_path']
+    os.makedirs(os.path.dirname(compact_path) or '.', exist_ok=True)
+    compact.save_npz(compact_path)
+
+    start = time.perf_counter()
+    compact = CompiledForest.load_npz(compact_path)
+    compact_load_s = time.perf_counter() - start
+    compact_scores = scores(y_test, compact.predict(X_test_scaled))
+
+    # Reporte del cambio en tamaño, tiempo de carga y precisión respecto al original
+    report = {
+        'original': {
+            'path': model_path,
+            'size_bytes': os.path.getsize(model_path),
+            'load_s': original_load_s,
+            'max_depth': forest.max_depth,
+            **original_scores,
+        },
+        'compact': {
+            'path': compact_path,
+            'size_bytes': os.path.getsize(compact_path),
+            'load_s': compact_load_s,
+            'max_depth': compact.max_depth,
+            'n_nodes': compact.n_nodes,
+            'float32': bool(export_config.get('float32', True)),
+            **compact_scores,
+        },
+    }
+    report['size_ratio'] = report['compact']['size_bytes'] / report['original']['size_bytes']
+    report['load_speedup'] = original_load_s / compact_load_s if compact_load_s else None
+    report['rmse_increase'] = compact_scores['RMSE'] / original_scores['RMSE'] - 1
+    report['pruning'] = pruning
+
+    report_path = export_config['report_path']
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w') as json_file:
+        json.dump(report, json_file, indent=4)
+
+    logger.info(f'Size {report["size_ratio"]:.1%} of the original, '
+                f'load {report["load_speedup"]:.0f}x faster, RMSE {report["rmse_increase"]:+.2%}')
+    logger.info(f'Export report saved to {report_path}')
+
+    logger.info('Export completed')
+
+
+if __name__ == '__main__':
+
+    args_parser = argparse.ArgumentParser()
+    args_parser.add_argument('--config', dest='config', required=True)
+    args = args_parser.parse_args()
+
+    export(config_path=args.config)
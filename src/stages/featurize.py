@@ -1,9 +1,10 @@
 import argparse
+import json
 import pandas as pd
 import numpy as np
-from scipy import stats
+from scipy import special, stats
 from scipy.stats import skew, kurtosis
-from typing import Text
+from typing import Dict, List, Optional, Sequence, Text, Tuple
 import yaml
 import os
 import sys
@@ -14,152 +15,386 @@ sys.path.append(project_dir)
 
 # Importamos directamente desde utils
 from utils.logs import get_logger
+from utils.storage import read_table, table_columns, write_table
 
 
-def featurize(config_path: Text) -> None:
-    """Create new features.
+# Columna datetime64 que escribe data_load con parse_datetime
+DATETIME_COLUMN = 'Datetime'
+TEXT_COLUMNS = ('Date', 'Time', 'Station', DATETIME_COLUMN)
+
+OUTLIER_MODES = ('vectorized', 'sequential')
+
+# Se define criterio individual (métodos de imputación) según cada variable
+IMPUTATION_METHODS = {
+    'CO_GT_': 'mean',
+    'NOx_GT_': 'mean',
+    'NO2_GT_': 'mean',
+    'PT08_S4_NO2_': 'mean',
+    'PT08_S5_O3_': 'mean',
+    'T': 'mean',
+    'RH': 'mean',
+    'AH': 'mean'
+}
+
+
+def outlier_bounds(columns: Sequence[np.ndarray], cut_off_std: float = 4.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the band mean ± cut_off_std standard deviations of every column, from all its rows.
+
+    Missing values are skipped, as in pandas' mean and std.
     Args:
-        config_path {Text}: path to config
+        columns {Sequence[np.ndarray]}: one 1-D array per feature, e.g. the columns of a DataFrame
+        cut_off_std {float}: half-width of the band in standard deviations
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: lower and upper bounds, one per column
     """
 
-    with open(config_path) as conf_file:
-        config = yaml.safe_load(conf_file)
+    lower, upper = [], []
+    for column in columns:
+        finite = ~np.isnan(column)
+        sample = column if finite.all() else column[finite]
+        mean = sample.mean(dtype=np.float64)
+        deviation = np.subtract(sample, mean, dtype=np.float64)
+        cut_off = cut_off_std * np.sqrt(np.dot(deviation, deviation) / (len(sample) - 1))
+        lower.append(mean - cut_off)
+        upper.append(mean + cut_off)
 
-    logger = get_logger('FEATURIZE', log_level=config['base']['log_level'])
+    return np.array(lower), np.array(upper)
 
-    logger.info('Load raw data cleaned')
-    dataframe = pd.read_csv(config['data_load']['dataset_csv_cleaned']) #dataframe es trusted_data
 
-    logger.info('Drop columns with no interest')
-    cols_to_drop = config['featurize']['cols_to_drop']
-    dataframe = dataframe.drop(cols_to_drop, axis=1) #dataframe es trusted_data
+def outlier_mask(columns: Sequence[np.ndarray], lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """Get the rows whose every column lies strictly within its bounds, as one combined mask.
 
-    
+    Rows with a missing value are outside, as in a pandas comparison.
+    Args:
+        columns {Sequence[np.ndarray]}: one 1-D array per feature
+        lower {np.ndarray}: lower bound of each column
+        upper {np.ndarray}: upper bound of each column
+    Returns:
+        np.ndarray: boolean mask of the rows to keep
     """
-    Ahora la función reemplaza los valores faltantes denominados con "-200" con NaN
-    y luego aplica métodos de imputación específicos a algunas columnas
-    
+
+    # Comparaciones en el lugar: no se crea ninguna matriz booleana del tamaño de los datos
+    keep = np.ones(len(columns[0]) if len(columns) else 0, dtype=bool)
+    for column, low, high in zip(columns, lower, upper):
+        keep &= column > low
+        keep &= column < high
+    return keep
+
+
+def fit_outlier_bounds(columns: Sequence[np.ndarray], mode: Text = 'vectorized',
+                       cut_off_std: float = 4.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Learn the outlier band of every column.
+    Args:
+        columns {Sequence[np.ndarray]}: one 1-D array per feature
+        mode {Text}: 'vectorized', bands of every column from all rows; 'sequential',
+            columns taken one after another, each band from the rows inside the
+            previous bands (the original behaviour, dependent on column order)
+        cut_off_std {float}: half-width of the band in standard deviations
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: lower and upper bounds, one per column
     """
-    logger.info('Missing Values and Imputation tasks')
-    
-    dataframe.replace(to_replace=-200, value=np.NaN, inplace=True)
-
-    # Se define criterio individual (métodos de imputación) según cada variable
-    imputation_methods = {
-        'CO_GT_': 'mean',
-        'NOx_GT_': 'mean',
-        'NO2_GT_': 'mean',
-        'PT08_S4_NO2_': 'mean',
-        'PT08_S5_O3_': 'mean',
-        'T': 'mean',
-        'RH': 'mean',
-        'AH': 'mean'
-    }
-
-    # Se itera sobre el diccionario y se aplica el método de imputación correspondiente a cada columna
+
+    if mode not in OUTLIER_MODES:
+        raise ValueError(f'Unknown outlier mode {mode}, expected one of {OUTLIER_MODES}')
+    if mode == 'vectorized':
+        return outlier_bounds(columns, cut_off_std)
+
+    # Filtrar columna por columna equivale a intersectar todas las bandas aprendidas,
+    # así que las filas conservadas salen de una sola máscara combinada
+    keep = np.ones(len(columns[0]) if len(columns) else 0, dtype=bool)
+    lower, upper = [], []
+    for column in columns:
+        (low,), (high,) = outlier_bounds([column[keep]], cut_off_std)
+        keep &= (column > low) & (column < high)
+        lower.append(low)
+        upper.append(high)
+
+    return np.array(lower), np.array(upper)
+
+
+def remove_outliers(dataframe: pd.DataFrame, mode: Text = 'vectorized', cut_off_std: float = 4.0) -> pd.DataFrame:
+    """Drop the rows with a numeric column outside its outlier band.
+    Args:
+        dataframe {pd.DataFrame}: imputed data
+        mode {Text}: 'vectorized' or 'sequential', see fit_outlier_bounds
+        cut_off_std {float}: half-width of the band in standard deviations
+    Returns:
+        pd.DataFrame: rows kept
+    """
+
+    # Las columnas de un DataFrame leído de disco son contiguas en memoria: se usan sin copiarlas
+    numeric = [column for column in dataframe.columns if pd.api.types.is_numeric_dtype(dataframe[column])]
+    columns = [dataframe[column].to_numpy() for column in numeric]
+    return dataframe[outlier_mask(columns, *fit_outlier_bounds(columns, mode, cut_off_std))]
+
+
+def fit_fill_values(data: pd.DataFrame, imputation_methods: Dict[Text, Text]) -> Dict[Text, float]:
+    """Get the imputation value of each column with a method; columns not in ``data`` are skipped.
+    Args:
+        data {pd.DataFrame}: training data, missing readings as NaN
+        imputation_methods {Dict[Text, Text]}: 'mean', 'median' or 'mode' per column
+    Returns:
+        Dict[Text, float]: column -> fill value
+    """
+
+    fill_values = {}
     for column, method in imputation_methods.items():
+        if column not in data.columns:
+            continue
         if method == 'mean':
-            mean_value = dataframe[column].mean()
-            dataframe[column] = dataframe[column].fillna(mean_value)
+            fill_values[column] = data[column].mean()
         elif method == 'median':
-            median_value = dataframe[column].median()
-            dataframe[column] = dataframe[column].fillna(median_value)
+            fill_values[column] = data[column].median()
         elif method == 'mode':
-            mode_value = dataframe[column].mode()[0]
-            dataframe[column] = dataframe[column].fillna(mode_value)
+            fill_values[column] = data[column].mode()[0]
         else:
-            # Imprime un error si el método de imputación no es reconocido
-            print(f'Método de imputación no válido para la columna {column}: {method}')
-    #return dataframe
-    
-    
-    """
-    Ahora se le da tratamiento a los outliers de las columnas numéricas.
-    Lo que se hace es eliminar outliers del DataFrame de pandas basado en una regla endurecida de 4 desviaciones estándar.
-    Todo esto previo a realizar transformaciones de datos para buscar distribuciones lo más simétricas posibles (cercanas a 0 en skew)    
-    
+            raise ValueError(f'Método de imputación no válido para la columna {column}: {method}')
+
+    return fill_values
+
+
+def fit_boxcox_lambdas(features: pd.DataFrame, skew_threshold: float = 1.25) -> Dict[Text, float]:
+    """Get the Box-Cox lambda of each skewed, strictly positive feature.
+    Args:
+        features {pd.DataFrame}: imputed training features, outliers removed
+        skew_threshold {float}: features with a larger absolute skew get Box-Cox
+    Returns:
+        Dict[Text, float]: feature -> lambda
     """
-    logger.info('Removing Outliers')
-    
-    for column in dataframe.columns:
-        if pd.api.types.is_numeric_dtype(dataframe[column]):
-            mean = dataframe[column].mean()
-            std_dev = dataframe[column].std()
-            
-            # Calcular límites para identificar outliers
-            cut_off = std_dev * 4
-            lower, upper = mean - cut_off, mean + cut_off
-            
-            # Filtrar outliers en el DataFrame original
-            dataframe = dataframe[(dataframe[column] > lower) & (dataframe[column] < upper)]
- 
- 
-    
-    
+
+    boxcox_lambdas = {}
+    for column in features.columns:
+        skewness_before = features[column].skew()
+        if skewness_before > skew_threshold or skewness_before < -skew_threshold:
+            if all(features[column] > 0):
+                transformed_data, best_lambda = stats.boxcox(features[column])
+                boxcox_lambdas[column] = float(best_lambda)
+                skewness_after = pd.Series(transformed_data).skew()
+                print(f"Columna '{column}': Skew antes = {skewness_before:.2f}, Skew después = {skewness_after:.2f}, Lambda = {best_lambda:.2f}")
+            else:
+                print(f"La columna '{column}' contiene valores no positivos y no se transformará.")
+
+    if not boxcox_lambdas:
+        print("No fue necesario realizar ninguna transformación Box-Cox bajo el criterio de sesgo establecido.")
+
+    return boxcox_lambdas
+
+
+class Featurizer:
+    """The featurize steps, learned once and applied to any batch.
+
+    ``fit`` learns from the training data, in order:
+
+    - the sentinel value marking missing readings (-200 in AirQualityUCI),
+    - the imputation value of each column (mean, median or mode),
+    - the outlier band of each numeric column, after imputation,
+    - the Box-Cox lambda of each skewed, strictly positive feature, after
+      removing outliers.
+
+    ``transform`` then applies them to a batch as NumPy operations on one
+    matrix, with a single combined outlier mask. Nothing is recomputed, so
+    a test set, a stream or the serving path get exactly the training
+    transformation. On the training data it gives the same result as the
+    featurize steps run one after another.
     """
-    Se separa el conjunto de características del conjunto de datos dataframe
-    para manipular más facilmente la transformación del conjunto de entrenamiento
-    y no afectar a la variable objetivo.
+
+    def __init__(self, columns: Sequence[Text], target: Optional[Text], sentinel: Optional[float],
+                 fill_values: Dict[Text, float], lower: Sequence[float], upper: Sequence[float],
+                 boxcox_lambdas: Dict[Text, float]) -> None:
+        self.columns = list(columns)
+        self.target = target
+        self.sentinel = sentinel
+        self.fill_values = {name: float(value) for name, value in fill_values.items()}
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.boxcox_lambdas = {name: float(value) for name, value in boxcox_lambdas.items()}
+
+        unknown = (set(self.fill_values) | set(self.boxcox_lambdas)) - set(self.columns)
+        if unknown:
+            raise ValueError(f'Featurizer constants for unknown columns: {sorted(unknown)}')
+        if len(self.lower) != len(self.columns) or len(self.upper) != len(self.columns):
+            raise ValueError('One outlier bound per column expected')
+
+    @property
+    def features(self) -> List[Text]:
+        return [name for name in self.columns if name != self.target]
+
+    @classmethod
+    def fit(cls, dataframe: pd.DataFrame, target: Optional[Text] = 'CO_GT_',
+            imputation_methods: Optional[Dict[Text, Text]] = None, sentinel: Optional[float] = -200,
+            outlier_mode: Text = 'vectorized', cut_off_std: float = 4.0,
+            skew_threshold: float = 1.25) -> 'Featurizer':
+        """Learn the featurize constants from training data.
+        Args:
+            dataframe {pd.DataFrame}: training data; its numeric columns are used
+            target {Text}: target column, not Box-Cox transformed; None if absent
+            imputation_methods {Dict[Text, Text]}: 'mean', 'median' or 'mode' per column,
+                IMPUTATION_METHODS by default
+            sentinel {float}: value marking a missing reading, None if there is none
+            outlier_mode {Text}: 'vectorized' or 'sequential', see fit_outlier_bounds
+            cut_off_std {float}: half-width of the outlier band in standard deviations
+            skew_threshold {float}: features with a larger absolute skew get Box-Cox
+        Returns:
+            Featurizer: fitted
+        """
+
+        imputation_methods = IMPUTATION_METHODS if imputation_methods is None else imputation_methods
+        columns = [name for name in dataframe.columns if pd.api.types.is_numeric_dtype(dataframe[name])]
+        data = dataframe[columns]
+        if sentinel is not None:
+            data = data.replace(to_replace=sentinel, value=np.nan)
+
+        # Valores de imputación por columna
+        fill_values = fit_fill_values(data, imputation_methods)
+        data = data.fillna(fill_values)
+
+        # Bandas de outliers sobre los datos imputados
+        values = [data[column].to_numpy() for column in columns]
+        lower, upper = fit_outlier_bounds(values, outlier_mode, cut_off_std)
+        data = data[outlier_mask(values, lower, upper)]
+
+        # Box-Cox a las variables con sesgo alto y estrictamente positivas
+        boxcox_lambdas = fit_boxcox_lambdas(data[[column for column in columns if column != target]],
+                                            skew_threshold)
+
+        return cls(columns, target if target in columns else None, sentinel, fill_values, lower, upper, boxcox_lambdas)
+
+    def transform(self, dataframe: pd.DataFrame,
+                  drop_outliers: bool = True) -> Tuple[pd.DataFrame, Optional[pd.Series]]:
+        """Apply the learned steps to a batch.
+        Args:
+            dataframe {pd.DataFrame}: batch with the features, and optionally the target
+            drop_outliers {bool}: drop the rows outside the outlier bands; otherwise they are kept
+        Returns:
+            Tuple[pd.DataFrame, Optional[pd.Series]]: features and target (None if absent)
+        Raises:
+            ValueError: a Box-Cox feature is not strictly positive
+        """
+
+        # Sin objetivo en el lote (p. ej. al servir) solo se usan las columnas de características
+        columns = [name for name in self.columns if name != self.target or name in dataframe.columns]
+        index = [self.columns.index(name) for name in columns]
+
+        # Una matriz ordenada por columnas: cada columna contigua en memoria
+        values = np.array(dataframe[columns], dtype=np.float64, order='F')
+        if self.sentinel is not None:
+            values[values == self.sentinel] = np.nan
+        fill = np.array([self.fill_values.get(name, np.nan) for name in columns])
+        missing = np.isnan(values)
+        if missing.any():
+            values = np.where(missing & ~np.isnan(fill), fill, values)
+            values = np.asfortranarray(values)
+
+        rows = dataframe.index
+        if drop_outliers:
+            keep = outlier_mask(list(values.T), self.lower[index], self.upper[index])
+            values, rows = values[keep], rows[keep]
+
+        for column, lmbda in self.boxcox_lambdas.items():
+            j = columns.index(column)
+            if (values[:, j] <= 0).any():
+                raise ValueError(f'Box-Cox feature {column} must be positive')
+            values[:, j] = special.boxcox(values[:, j], lmbda)
+
+        features = [j for j, name in enumerate(columns) if name != self.target]
+        X = pd.DataFrame(values[:, features], index=rows, columns=[columns[j] for j in features])
+        y = None
+        if self.target in columns:
+            y = pd.Series(values[:, columns.index(self.target)], index=rows, name=self.target)
+
+        return X, y
+
+    def to_dict(self) -> Dict:
+        return {
+            'columns': self.columns,
+            'target': self.target,
+            'sentinel': self.sentinel,
+            'fill_values': self.fill_values,
+            'lower': self.lower.tolist(),
+            'upper': self.upper.tolist(),
+            'boxcox_lambdas': self.boxcox_lambdas,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Featurizer':
+        return cls(data['columns'], data['target'], data['sentinel'], data['fill_values'],
+                   data['lower'], data['upper'], data['boxcox_lambdas'])
+
+    def save(self, path: Text) -> None:
+        with open(path, 'w') as json_file:
+            json.dump(self.to_dict(), json_file, indent=4)
+
+    @classmethod
+    def load(cls, path: Text) -> 'Featurizer':
+        with open(path) as json_file:
+            return cls.from_dict(json.load(json_file))
+
+
+def featurize(config_path: Text) -> None:
+    """Create new features.
+    Args:
+        config_path {Text}: path to config
     """
-    
-    logger.info('Separation of X and y prior to BoxCox transformation')
 
-    X = dataframe.drop(columns=['CO_GT_'], axis=1)
-    y = dataframe['CO_GT_'] 
-    
- 
+    with open(config_path) as conf_file:
+        config = yaml.safe_load(conf_file)
+
+    logger = get_logger('FEATURIZE', log_level=config['base']['log_level'])
+
+    logger.info('Load raw data cleaned')
+    storage = config.get('storage')
+    cleaned_path = config['data_load']['dataset_csv_cleaned']
+    cols_to_drop = config['featurize']['cols_to_drop']
+
+    # Solo se leen las columnas que se usan: las de featurize.usecols o todas menos cols_to_drop
+    usecols = config['featurize'].get('usecols') or [
+        col for col in table_columns(cleaned_path, storage) if col not in cols_to_drop]
+    sensor_dtype = config['data_load'].get('sensor_dtype', 'float64')
+    dtype = {col: sensor_dtype for col in usecols if col not in TEXT_COLUMNS}
+    dataframe = read_table(cleaned_path, storage, columns=usecols, dtype=dtype) #dataframe es trusted_data
+
+    # La fecha y hora ya unidas en data_load pasan a ser el índice
+    if DATETIME_COLUMN in dataframe.columns:
+        dataframe = dataframe.set_index(pd.to_datetime(dataframe.pop(DATETIME_COLUMN), format='ISO8601'))
+
+    logger.info('Drop columns with no interest')
+    dataframe = dataframe.drop(columns=[col for col in cols_to_drop if col in dataframe.columns]) #dataframe es trusted_data
+
     
     """
-    Ahora se aplica tratamiento para mitigar sesgo.
-    Para esto se propone propone la transformación boxcox para lidiar con el sesgo dañino previo a entrenamiento de modelos.
-    
-    Se aplica la transformación Box-Cox a las columnas de un DataFrame
-    cuyo skew sea superior a 1.25 o menor a -1.25. Imprime las variables transformadas,
-    su skew antes y después de la transformación, y el valor de lambda utilizado.
-    Indica si no fue necesario realizar ninguna transformación.
-
+    El Featurizer aprende de estos datos, en orden:
+    - el reemplazo de los valores faltantes denominados con "-200" con NaN y la imputación de cada columna,
+    - las bandas de outliers (regla endurecida de 4 desviaciones estándar),
+    - los lambdas de Box-Cox de las variables con skew superior a 1.25 o menor a -1.25,
+    y luego los aplica para obtener X e y. Se guarda para aplicar exactamente la misma
+    transformación a datos nuevos sin recalcularla.
     """
+    logger.info('Fit featurizer: imputation, outlier bounds and Box-Cox lambdas')
 
-    logger.info('Box-Cox Transformation to feature set X')
-
-
-    # Variable para rastrear si alguna columna fue transformada
-    transformation_applied = False
-
-    for column in X.columns:
-        # Verificar que la columna sea de tipo numérico
-        if pd.api.types.is_numeric_dtype(X[column]):
-            skewness_before = X[column].skew()
-            # Verificar el skewness de la columna
-            if skewness_before > 1.25 or skewness_before < -1.25:
-                # Asegurarse de que todos los valores sean positivos
-                if all(X[column] > 0):
-                    # Aplicar la transformación Box-Cox
-                    transformed_data, best_lambda = stats.boxcox(X[column])
-                    X[column] = transformed_data
-                    skewness_after = X[column].skew()
-                    print(f"Columna '{column}': Skew antes = {skewness_before:.2f}, Skew después = {skewness_after:.2f}, Lambda = {best_lambda:.2f}")
-                    transformation_applied = True
-                else:
-                    print(f"La columna '{column}' contiene valores no positivos y no se transformará.")
-        else:
-            print(f"La columna '{column}' no es numérica y será ignorada.")
+    outlier_mode = config['featurize'].get('outlier_mode', 'vectorized')
+    featurizer = Featurizer.fit(dataframe, target='CO_GT_', outlier_mode=outlier_mode,
+                                cut_off_std=config['featurize'].get('outlier_std', 4.0))
+
+    logger.info('Transform data into X and y')
+    X, y = featurizer.transform(dataframe)
+    logger.info(f'{len(dataframe) - len(X)} outlier rows removed ({outlier_mode})')
+
+    logger.info('Save featurizer')
+    # Único artefacto con los lambdas de Box-Cox; data_split los lee de aquí
+    featurizer.save(config['featurize']['featurizer_path'])
 
-    if not transformation_applied:
-        print("No fue necesario realizar ninguna transformación Box-Cox bajo el criterio de sesgo establecido.")
-    
     
     """
-    Se guardan en csv conjuntos "X_scaled" y "y" que servirán en etapas posteriores del pipeline.
+    Se guardan en el formato de almacenamiento configurado (csv por defecto) los conjuntos "X_scaled" y "y" que servirán en etapas posteriores del pipeline.
     """
     
     logger.info('Save X_scaled and y sets')
     
     X_scaled_csv_path = config['featurize']['X_scaled_csv_path']
     y_csv_path = config['featurize']['y_csv_path']
-    X.to_csv(X_scaled_csv_path, index=False)
-    y.to_csv(y_csv_path, index=False)    
-      
+    write_table(X, X_scaled_csv_path, config.get('storage'))
+    write_table(y.to_frame(), y_csv_path, config.get('storage'))
+
     logger.info('featurize complete')
     
     
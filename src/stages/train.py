@@ -1,5 +1,4 @@
 import argparse
-import pandas as pd
 from typing import Text
 import yaml
 import os
@@ -15,6 +14,7 @@ sys.path.append(project_dir)
 
 # Importamos directamente desde utils
 from utils.logs import get_logger
+from utils.storage import load_matrix
 
 
 def train(config_path: Text) -> None:
@@ -31,11 +31,11 @@ def train(config_path: Text) -> None:
 
     logger.info('Get data splitted')
     
-    X_train_scaled = pd.read_csv(config['data_split']['X_train_scaled_csv_path'])
-    y_train = pd.read_csv(config['data_split']['y_train_csv_path'])
+    X_train_scaled = load_matrix(config['data_split']['X_train_scaled_csv_path'], config.get('storage'))
+    y_train = load_matrix(config['data_split']['y_train_csv_path'], config.get('storage'))
     
     # Asegurando que y_train es un vector unidimensional
-    y_train = y_train.squeeze()  # Esto funciona si y_train es un DataFrame con una sola columna
+    y_train = y_train.squeeze()  # Esto funciona si y_train es un DataFrame o una matriz con una sola columna
     
     logger.info('Train model')  
     
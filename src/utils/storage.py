@@ -0,0 +1,268 @@
+"""Provides the storage layer for the tables passed between pipeline stages."""
+
+import importlib.util
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Text, Union
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger('STORAGE')
+
+FORMATS = ('csv', 'parquet', 'feather', 'npz')
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather',
+              'npz': '.npz'}
+
+# npz keys holding the column order and the missing-value masks of text columns
+_COLUMNS_KEY = '__columns__'
+_NA_PREFIX = '__na__'
+
+_fallbacks_logged = set()
+
+
+def _has_pyarrow() -> bool:
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def storage_format(storage: Optional[Dict]) -> Text:
+    """Get the effective table format of a ``storage`` config section.
+
+    Parquet and Feather need pyarrow; without it tables fall back to npz,
+    which only needs NumPy.
+    Args:
+        storage {Dict}: 'format', 'compression' and 'export_csv' keys, None
+            for CSV
+    Returns:
+        Text: one of FORMATS
+    """
+
+    fmt = (storage or {}).get('format') or 'csv'
+    if fmt not in FORMATS:
+        raise ValueError(
+            f'Unknown storage format {fmt}, expected one of {FORMATS}')
+    if fmt in ('parquet', 'feather') and not _has_pyarrow():
+        if fmt not in _fallbacks_logged:
+            _fallbacks_logged.add(fmt)
+            logger.warning(f'pyarrow is not installed, storing tables as npz '
+                           f'instead of {fmt}')
+        fmt = 'npz'
+    return fmt
+
+
+def table_path(path: Text, storage: Optional[Dict]) -> Text:
+    """Get the file actually used for a table.
+
+    That is ``path`` with the extension of the format.
+    Args:
+        path {Text}: path configured in params.yaml,
+            e.g. 'data/splitdata/X_train.csv'
+        storage {Dict}: storage config section
+    Returns:
+        Text: e.g. 'data/splitdata/X_train.parquet'
+    """
+
+    return os.path.splitext(path)[0] + EXTENSIONS[storage_format(storage)]
+
+
+def write_table(df: pd.DataFrame, path: Text,
+                storage: Optional[Dict] = None) -> Text:
+    """Write a DataFrame (without its index) in the configured format.
+    Args:
+        df {pd.DataFrame}: table to write
+        path {Text}: configured path, its extension is replaced by the format's
+        storage {Dict}: storage config section
+    Returns:
+        Text: path written
+    """
+
+    fmt = storage_format(storage)
+    compression = (storage or {}).get('compression')
+    path = table_path(path, storage)
+
+    if fmt == 'csv':
+        df.to_csv(path, index=False, compression=compression)
+        return path
+
+    if (storage or {}).get('export_csv'):
+        # Human-readable copy next to the binary table
+        df.to_csv(os.path.splitext(path)[0] + '.csv', index=False)
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False, compression=compression)
+    elif fmt == 'feather':
+        df.reset_index(drop=True).to_feather(path, compression=compression)
+    else:
+        _write_npz(df, path, compressed=bool(compression))
+
+    return path
+
+
+def append_table(df: pd.DataFrame, path: Text,
+                 storage: Optional[Dict] = None) -> Text:
+    """Append rows to a table written by ``write_table``, or create it.
+
+    CSV is appended in place. The binary formats cannot be appended to, so
+    the existing table is read and rewritten with the new rows.
+    Args:
+        df {pd.DataFrame}: rows to append, with the table's columns
+        path {Text}: configured path, its extension is replaced by the format's
+        storage {Dict}: storage config section
+    Returns:
+        Text: path written
+    """
+
+    if not os.path.exists(table_path(path, storage)):
+        return write_table(df, path, storage)
+
+    if storage_format(storage) == 'csv':
+        path = table_path(path, storage)
+        df.to_csv(path, index=False, header=False, mode='a',
+                  compression=(storage or {}).get('compression'))
+        return path
+
+    existing = read_table(path, storage)
+    return write_table(pd.concat([existing, df], ignore_index=True), path,
+                       storage)
+
+
+def read_table(path: Text, storage: Optional[Dict] = None,
+               columns: Optional[Sequence[Text]] = None,
+               dtype: Optional[Dict[Text, Any]] = None) -> pd.DataFrame:
+    """Read a table written by ``write_table``.
+    Args:
+        path {Text}: configured path, its extension is replaced by the format's
+        storage {Dict}: storage config section
+        columns {Sequence[Text]}: read only these columns
+        dtype {Dict[Text, Any]}: column types; CSV parses straight into them
+    Returns:
+        pd.DataFrame
+    """
+
+    fmt = storage_format(storage)
+    compression = (storage or {}).get('compression')
+    path = table_path(path, storage)
+    columns = list(columns) if columns is not None else None
+
+    if fmt == 'csv':
+        df = pd.read_csv(path, usecols=columns, dtype=dtype,
+                         compression=compression)
+        return df[columns] if columns is not None else df
+    if fmt == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+    elif fmt == 'feather':
+        df = pd.read_feather(path, columns=columns)
+    else:
+        df = _read_npz(path, columns)
+
+    # Binary formats keep the written types; convert only the columns that
+    # differ
+    casts = {col: kind for col, kind in (dtype or {}).items()
+             if col in df.columns and df[col].dtype != np.dtype(kind)}
+    return df.astype(casts) if casts else df
+
+
+def table_columns(path: Text, storage: Optional[Dict] = None) -> List[Text]:
+    """Get the column names of a table without reading its data.
+    Args:
+        path {Text}: configured path, its extension is replaced by the format's
+        storage {Dict}: storage config section
+    Returns:
+        List[Text]: column names in table order
+    """
+
+    fmt = storage_format(storage)
+    compression = (storage or {}).get('compression')
+    path = table_path(path, storage)
+
+    if fmt == 'csv':
+        header = pd.read_csv(path, nrows=0, compression=compression)
+        return list(header.columns)
+    if fmt == 'parquet':
+        import pyarrow.parquet
+        return pyarrow.parquet.read_schema(path).names
+    if fmt == 'feather':
+        import pyarrow.ipc
+        return pyarrow.ipc.open_file(path).schema.names
+    with np.load(path, allow_pickle=False) as data:
+        return data[_COLUMNS_KEY].tolist()
+
+
+def matrix_path(path: Text) -> Text:
+    """Get the .npy matrix next to a table: ``path`` with a .npy extension."""
+
+    return os.path.splitext(path)[0] + '.npy'
+
+
+def write_matrix(df: pd.DataFrame, path: Text,
+                 dtype: Any = np.float64) -> Text:
+    """Write a numeric table as a C-ordered .npy matrix, ready to be mmapped.
+    Args:
+        df {pd.DataFrame}: numeric table
+        path {Text}: configured table path, its extension is replaced by .npy
+        dtype: matrix type
+    Returns:
+        Text: path written
+    """
+
+    path = matrix_path(path)
+    np.save(path, np.ascontiguousarray(df.to_numpy(dtype=dtype)))
+    return path
+
+
+def load_matrix(path: Text, storage: Optional[Dict] = None
+                ) -> Union[np.ndarray, pd.DataFrame]:
+    """Load a model input: the .npy matrix if storage.matrices, else the table.
+
+    A memory-mapped matrix opens instantly whatever its size; its pages are
+    read on access and shared by every process mapping the file, and joblib
+    hands np.memmap arguments to its workers by file name instead of
+    pickling a copy for each one.
+    Args:
+        path {Text}: configured table path
+        storage {Dict}: storage config section
+    Returns:
+        np.ndarray (read-only np.memmap) or pd.DataFrame
+    """
+
+    if (storage or {}).get('matrices'):
+        return np.load(matrix_path(path), mmap_mode='r')
+    return read_table(path, storage)
+
+
+def _write_npz(df: pd.DataFrame, path: Text, compressed: bool) -> None:
+    # One typed array per column; text columns as fixed-width unicode plus a
+    # missing-value mask
+    arrays = {_COLUMNS_KEY: np.array([str(col) for col in df.columns])}
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        if (pd.api.types.is_numeric_dtype(values)
+                or pd.api.types.is_datetime64_any_dtype(values)):
+            arrays[str(i)] = values.to_numpy()
+        else:
+            isna = values.isna().to_numpy()
+            text = values.where(~isna, '').astype(str)
+            arrays[str(i)] = text.to_numpy(dtype=str)
+            if isna.any():
+                arrays[f'{_NA_PREFIX}{i}'] = isna
+
+    save = np.savez_compressed if compressed else np.savez
+    with open(path, 'wb') as npz_file:
+        save(npz_file, **arrays)
+
+
+def _read_npz(path: Text, columns: Optional[Sequence[Text]]) -> pd.DataFrame:
+    with np.load(path, allow_pickle=False) as data:
+        names = data[_COLUMNS_KEY].tolist()
+        wanted = columns if columns is not None else names
+        table = {}
+        for col in wanted:
+            i = names.index(col)
+            values = data[str(i)]
+            if values.dtype.kind == 'U':
+                values = values.astype(object)
+                if f'{_NA_PREFIX}{i}' in data:
+                    values[data[f'{_NA_PREFIX}{i}']] = np.nan
+            table[col] = values
+
+    return pd.DataFrame(table, columns=list(wanted))
@@ -0,0 +1,159 @@
+"""Provides the fitted feature transform shared by training and serving."""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Text
+
+import numpy as np
+
+
+class FeatureTransform:
+    """Box-Cox (featurize) followed by min-max scaling (data_split).
+
+    Both steps are folded into per-column constants so serving applies them
+    as one vectorized kernel, with no sklearn/scipy call::
+
+        boxcox + scale:  x ** lam * (scale / lam) + (min - scale / lam)
+        log (lam == 0):  log(x) * scale + min
+        scale only:      x * scale + min
+
+    which is the same as ``MinMaxScaler.transform(scipy.stats.boxcox(x, lam))``
+    up to float rounding.
+
+    As in featurize, a reading equal to ``sentinel`` (-200 in AirQualityUCI)
+    is missing and is replaced by the training fill value of its feature
+    before either step, so every feature needs a fill value.
+    """
+
+    def __init__(self, features: Sequence[Text],
+                 boxcox_lambdas: Dict[Text, float],
+                 scale: Sequence[float], min_: Sequence[float],
+                 sentinel: Optional[float] = None,
+                 fill_values: Optional[Dict[Text, float]] = None) -> None:
+        self.features = list(features)
+        self.boxcox_lambdas = {name: float(value)
+                               for name, value in boxcox_lambdas.items()}
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.min_ = np.asarray(min_, dtype=np.float64)
+        self.sentinel = None if sentinel is None else float(sentinel)
+        self.fill_values = {name: float(value)
+                            for name, value in (fill_values or {}).items()}
+
+        unknown = set(self.boxcox_lambdas) - set(self.features)
+        if unknown:
+            raise ValueError(
+                f'Box-Cox lambdas for unknown features: {sorted(unknown)}')
+        unfilled = [name for name in self.features
+                    if name not in self.fill_values]
+        if self.sentinel is not None and unfilled:
+            raise ValueError(f'Features without a fill value: {unfilled}')
+        self._fill = np.array([self.fill_values.get(name, np.nan)
+                               for name in self.features])
+
+        # Precomputed constants of the fused kernel
+        lambdas = np.array([self.boxcox_lambdas.get(name, np.nan)
+                            for name in self.features])
+        self._boxcox = ~np.isnan(lambdas)
+        self._log = self._boxcox & (lambdas == 0)
+        power = self._boxcox & ~self._log
+        self._exponent = np.where(power, lambdas, 1.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factor = np.where(power, self.scale / lambdas, self.scale)
+        self._factor = factor
+        self._offset = np.where(power, self.min_ - factor, self.min_)
+        self._needs_power = bool(power.any())
+
+    @classmethod
+    def fit(cls, features: Sequence[Text], boxcox_lambdas: Dict[Text, float],
+            scaler: Any, sentinel: Optional[float] = None,
+            fill_values: Optional[Dict[Text, float]] = None
+            ) -> 'FeatureTransform':
+        """Build the transform from a featurizer and a fitted MinMaxScaler."""
+
+        fill_values = {name: fill_values[name]
+                       for name in features if name in (fill_values or {})}
+        return cls(features, boxcox_lambdas, scale=scaler.scale_,
+                   min_=scaler.min_, sentinel=sentinel,
+                   fill_values=fill_values)
+
+    @property
+    def boxcox_features(self) -> List[Text]:
+        return [name for name, flag in zip(self.features, self._boxcox)
+                if flag]
+
+    def impute(self, X: np.ndarray) -> np.ndarray:
+        """Replace missing readings (the sentinel) by their fill values.
+        Args:
+            X {np.ndarray}: float64 matrix in ``features`` order
+        Returns:
+            np.ndarray: X itself when nothing is missing, else a new matrix
+        """
+
+        if self.sentinel is None:
+            return X
+        missing = X == self.sentinel
+        if not missing.any():
+            return X
+        return np.where(missing, self._fill, X)
+
+    def invalid_rows(self, X: np.ndarray) -> np.ndarray:
+        """Flag the rows Box-Cox cannot map: a non-positive Box-Cox feature.
+
+        Missing readings are imputed first, so only real readings are flagged.
+        Args:
+            X {np.ndarray}: float64 matrix in ``features`` order
+        Returns:
+            np.ndarray: boolean mask, one entry per row
+        """
+
+        if not self._boxcox.any():
+            return np.zeros(X.shape[0], dtype=bool)
+        return (self.impute(X)[:, self._boxcox] <= 0).any(axis=1)
+
+    def transform(self, X: Any) -> np.ndarray:
+        """Apply Box-Cox + min-max scaling to a matrix in ``features`` order.
+        Args:
+            X: array-like of shape (n_samples, n_features)
+        Returns:
+            np.ndarray: transformed float64 matrix
+        """
+
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.features):
+            raise ValueError(
+                f'X must have shape (n_samples, {len(self.features)})')
+        X = self.impute(X)
+        if self.invalid_rows(X).any():
+            raise ValueError(
+                f'Box-Cox features must be positive: {self.boxcox_features}')
+
+        out = np.power(X, self._exponent) if self._needs_power else X.copy()
+        if self._log.any():
+            out[:, self._log] = np.log(X[:, self._log])
+        out *= self._factor
+        out += self._offset
+
+        return out
+
+    def to_dict(self) -> Dict:
+        return {
+            'features': self.features,
+            'boxcox_lambdas': self.boxcox_lambdas,
+            'scale': self.scale.tolist(),
+            'min': self.min_.tolist(),
+            'sentinel': self.sentinel,
+            'fill_values': self.fill_values,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'FeatureTransform':
+        return cls(data['features'], data['boxcox_lambdas'], data['scale'],
+                   data['min'], data.get('sentinel'), data.get('fill_values'))
+
+    def save(self, path: Text) -> None:
+        with open(path, 'w') as json_file:
+            json.dump(self.to_dict(), json_file, indent=4)
+
+    @classmethod
+    def load(cls, path: Text) -> 'FeatureTransform':
+        with open(path) as json_file:
+            return cls.from_dict(json.load(json_file))
@@ -0,0 +1,645 @@
+import unittest
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import joblib
+import numpy as np
+from fastapi.testclient import TestClient
+from sklearn.ensemble import RandomForestRegressor
+
+from app.admission import AdmissionController, Overloaded
+from app.batching import MicroBatcher
+from app.feeds import CLOSE_TRY_AGAIN_LATER, FeedSession
+from app.main import STREAM_MAX_LINE_BYTES, admission, app, model_holder, model_registry
+from app.model_holder import ModelHolder
+from app.model_registry import ModelRegistry, parse_versions
+from app.prediction_cache import PredictionCache
+from app.streaming import StreamFormatError, iter_lines
+from app.workers import InferencePool
+from src.utils.forest import CompiledForest
+from src.utils.transforms import FeatureTransform
+
+
+ITEM = {
+    'NOx_GT_': 166.0, 'NO2_GT_': 113.0, 'PT08_S4_NO2_': 1692.0, 'PT08_S5_O3_': 1268.0,
+    'T': 13.6, 'RH': 48.9, 'AH': 0.7578
+}
+
+
+class TestApp(unittest.TestCase):
+    """
+    Pruebas unitarias de la API de predicción (app/main.py).
+    """
+
+    def test_predict(self):
+        # Verifica que /predict responda con una predicción numérica
+        with TestClient(app) as client:
+            response = client.post('/predict', json=ITEM)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.json()['CO(GT)'], float)
+
+    def test_predict_non_finite(self):
+        # Verifica que un NaN se rechace con 422 antes de llegar al modelo
+        with TestClient(app) as client:
+            response = client.post('/predict', content=json.dumps(dict(ITEM, T=float('nan'))),
+                                   headers={'content-type': 'application/json'})
+        self.assertEqual(response.status_code, 422)
+
+    def test_model_loaded_once(self):
+        # Verifica que el modelo se cargue al arrancar y no en cada petición
+        with TestClient(app) as client:
+            snapshot = model_holder.current
+            client.post('/predict', json=ITEM)
+            client.post('/predict', json=ITEM)
+            self.assertIs(model_holder.current, snapshot)
+
+    def test_predict_batch_matches_single(self):
+        # Verifica que /predict/batch devuelva lo mismo que /predict fila a fila
+        rows = [ITEM, dict(ITEM, T=25.0, RH=30.0)]
+        columns = {name: [row[name] for row in rows] for name in ITEM}
+        with TestClient(app) as client:
+            batch = client.post('/predict/batch', json=columns).json()['CO(GT)']
+            single = [client.post('/predict', json=row).json()['CO(GT)'] for row in rows]
+        for b, s in zip(batch, single):
+            self.assertAlmostEqual(b, s)
+
+    def test_predict_batch_validation(self):
+        # Verifica que se rechacen columnas de distinto largo o incompletas
+        columns = {name: [value] for name, value in ITEM.items()}
+        with TestClient(app) as client:
+            uneven = client.post('/predict/batch', json=dict(columns, T=[1.0, 2.0]))
+            missing = client.post('/predict/batch', json={'T': [1.0]})
+        self.assertEqual(uneven.status_code, 422)
+        self.assertEqual(missing.status_code, 422)
+
+    def test_predict_batch_binary(self):
+        # Verifica los formatos binarios .npy y float32 crudo con otro orden de columnas
+        X = np.array([[ITEM[name] for name in ITEM], [ITEM[name] + 1 for name in ITEM]])
+        buffer = io.BytesIO()
+        np.save(buffer, X)
+        with TestClient(app) as client:
+            expected = client.post('/predict/batch', json={name: list(X[:, i]) for i, name in enumerate(ITEM)})
+            npy = client.post('/predict/batch', content=buffer.getvalue(),
+                              headers={'content-type': 'application/x-npy'})
+            raw = client.post('/predict/batch', content=X[:, ::-1].astype('<f4').tobytes(),
+                              headers={'content-type': 'application/octet-stream',
+                                       'x-feature-order': ','.join(reversed(list(ITEM)))})
+            bad = client.post('/predict/batch', content=b'\x00' * 5,
+                              headers={'content-type': 'application/octet-stream'})
+        np.testing.assert_allclose(np.load(io.BytesIO(npy.content)), expected.json()['CO(GT)'])
+        np.testing.assert_allclose(np.frombuffer(raw.content, '<f4'), expected.json()['CO(GT)'], rtol=1e-6)
+        self.assertEqual(bad.status_code, 422)
+
+    def test_metrics_endpoint(self):
+        # Verifica que /metrics exponga latencias por fase, contadores y versión del modelo
+        columns = {name: [value] for name, value in ITEM.items()}
+        with TestClient(app) as client:
+            client.post('/predict', json=ITEM)
+            client.post('/predict/batch', json=columns)
+            response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'model_info{{version="{model_holder.current.version}"}} 1', response.text)
+        self.assertIn('http_requests_total{path="/predict",status="200"}', response.text)
+        self.assertIn('prediction_stage_duration_seconds_count{endpoint="/predict/batch",stage="parse"}',
+                      response.text)
+        self.assertIn('model_predict_duration_seconds_bucket{engine="compiled",le="+Inf"}', response.text)
+        self.assertIn('# TYPE microbatch_batches_total counter', response.text)
+        self.assertIn('# TYPE admission_shed_requests_total counter', response.text)
+
+    def test_health(self):
+        # Verifica que la API solo se declare lista tras cargar y calentar el modelo
+        not_started = TestClient(app).get('/health/ready')
+        with TestClient(app) as client:
+            live = client.get('/health/live')
+            ready = client.get('/health/ready')
+        self.assertEqual(not_started.status_code, 503)
+        self.assertEqual(live.status_code, 200)
+        self.assertEqual(ready.status_code, 200)
+        self.assertEqual(ready.json()['model_version'], model_holder.current.version)
+
+    def test_websocket_feed(self):
+        # Verifica que la sesión WebSocket responda lecturas y lotes en orden, y los errores sin cerrar
+        with TestClient(app) as client:
+            expected = client.post('/predict', json=ITEM).json()['CO(GT)']
+            with client.websocket_connect('/ws/predict') as websocket:
+                websocket.send_json(dict(ITEM, id=1))
+                websocket.send_json({'id': 2, 'readings': [ITEM, ITEM]})
+                websocket.send_json({'id': 3, 'T': 1.0})
+                websocket.send_text('not json')
+                websocket.send_json([ITEM])
+                replies = [websocket.receive_json() for _ in range(5)]
+        self.assertEqual(replies[0], {'id': 1, 'CO(GT)': expected})
+        self.assertEqual(replies[1]['id'], 2)
+        np.testing.assert_allclose(replies[1]['CO(GT)'], [expected, expected])
+        self.assertEqual(replies[2]['id'], 3)
+        self.assertIn('Missing feature', replies[2]['error'])
+        self.assertIn('Invalid JSON', replies[3]['error'])
+        np.testing.assert_allclose(replies[4]['CO(GT)'], [expected])
+
+    def test_websocket_binary_frame(self):
+        # Verifica que un mensaje binario reciba un error sin cerrar la conexión
+        with TestClient(app) as client:
+            with client.websocket_connect('/ws/predict') as websocket:
+                websocket.send_bytes(b'\x00\x01')
+                websocket.send_json(dict(ITEM, id=2))
+                replies = [websocket.receive_json() for _ in range(2)]
+        self.assertIn('binary', replies[0]['error'])
+        self.assertEqual(replies[1]['id'], 2)
+        self.assertIn('CO(GT)', replies[1])
+
+    def test_startup_report(self):
+        # Verifica que el arranque reporte el tiempo de importación, carga del modelo y warmup
+        with TestClient(app) as client:
+            report = client.get('/startup').json()
+            metrics = client.get('/metrics').text
+        self.assertEqual(set(report), {'import', 'model_load', 'warmup', 'total'})
+        self.assertGreaterEqual(report['total'], report['model_load'] + report['warmup'])
+        self.assertIn('startup_duration_seconds{phase="warmup"}', metrics)
+
+    def test_predict_stream_ndjson(self):
+        # Verifica que el endpoint de streaming puntúe cada línea NDJSON en orden
+        rows = [dict(ITEM, T=float(t)) for t in range(5, 30)]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\n'
+        with TestClient(app) as client:
+            response = client.post('/predict/stream', content=body,
+                                   headers={'content-type': 'application/x-ndjson'})
+            expected = client.post('/predict/batch', json={name: [row[name] for row in rows] for name in ITEM})
+        lines = response.text.strip().split('\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([json.loads(line)['CO(GT)'] for line in lines], expected.json()['CO(GT)'])
+
+    def test_predict_stream_csv(self):
+        # Verifica el formato CSV con columnas en otro orden y el error por línea malformada
+        header = ','.join(reversed(list(ITEM)))
+        line = ','.join(str(ITEM[name]) for name in reversed(list(ITEM)))
+        with TestClient(app) as client:
+            ok = client.post('/predict/stream', content=f'{header}\n{line}\n{line}\n',
+                             headers={'content-type': 'text/csv'})
+            bad = client.post('/predict/stream', content=f'{header}\n{line}\n1,2\n',
+                              headers={'content-type': 'text/csv'})
+        self.assertEqual(ok.text.split('\n')[0], 'CO(GT)')
+        self.assertEqual(len(ok.text.strip().split('\n')), 3)
+        self.assertEqual(bad.status_code, 422)
+        self.assertIn('line 3', bad.json()['detail'])
+
+    def test_predict_stream_non_finite(self):
+        # Verifica que NaN o Infinity en el stream se rechacen con el número de línea
+        body = json.dumps(ITEM) + '\n\n' + json.dumps(dict(ITEM, RH=float('inf'))) + '\n'
+        with TestClient(app) as client:
+            ndjson = client.post('/predict/stream', content=body,
+                                 headers={'content-type': 'application/x-ndjson'})
+            csv = client.post('/predict/stream', content=f"{','.join(ITEM)}\n{','.join(['nan'] * 7)}\n",
+                              headers={'content-type': 'text/csv'})
+        self.assertEqual(ndjson.status_code, 422)
+        self.assertEqual(ndjson.json()['detail'], 'line 3: Features must be finite numbers')
+        self.assertEqual(csv.status_code, 422)
+        self.assertIn('line 2', csv.json()['detail'])
+
+    def test_predict_stream_long_line(self):
+        # Verifica que una línea demasiado larga se rechace con 422 en lugar de acumularse en memoria
+        body = json.dumps(ITEM) + '\n' + ' ' * (STREAM_MAX_LINE_BYTES + 1) + '\n'
+        with TestClient(app) as client:
+            response = client.post('/predict/stream', content=body,
+                                   headers={'content-type': 'application/x-ndjson'})
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('line 2', response.json()['detail'])
+
+        # Las líneas se reconstruyen igual aunque crucen varios bloques, y el límite cuenta la línea entera
+        async def split(chunks, max_line_bytes=None):
+            async def stream():
+                for chunk in chunks:
+                    yield chunk
+            return [line async for line in iter_lines(stream(), max_line_bytes)]
+
+        chunks = [b'ab', b'c\nde', b'', b'f\n\ng', b'h']
+        self.assertEqual(asyncio.run(split(chunks)), [b'abc', b'def', b'', b'gh'])
+        self.assertEqual(asyncio.run(split(chunks, 3)), [b'abc', b'def', b'', b'gh'])
+        with self.assertRaises(StreamFormatError):
+            asyncio.run(split(chunks, 2))
+
+    def test_non_positive_boxcox_feature(self):
+        # Verifica que un valor no positivo en una variable Box-Cox responda 422 sin afectar al resto
+        transform = FeatureTransform(list(ITEM), {'NOx_GT_': 0.5}, scale=[1.0] * 7, min_=[0.0] * 7)
+        bad = dict(ITEM, NOx_GT_=-5.0)
+        rows = [ITEM, bad]
+        with TestClient(app) as client, \
+                mock.patch.object(model_holder, '_current', model_holder.current._replace(transform=transform)):
+            single = client.post('/predict', json=bad)
+            batch = client.post('/predict/batch', json={name: [row[name] for row in rows] for name in ITEM})
+            stream = client.post('/predict/stream', content='\n'.join(json.dumps(row) for row in rows),
+                                 headers={'content-type': 'application/x-ndjson'})
+            with client.websocket_connect('/ws/predict') as websocket:
+                websocket.send_text(json.dumps(bad))
+                reply = websocket.receive_json()
+            ok = client.post('/predict', json=ITEM)
+        self.assertEqual(single.status_code, 422)
+        self.assertEqual(batch.status_code, 422)
+        self.assertIn('row 1', batch.json()['detail'])
+        self.assertEqual(stream.status_code, 422)
+        self.assertIn('line 2', stream.json()['detail'])
+        self.assertIn('Box-Cox', reply['error'])
+        self.assertEqual(ok.status_code, 200)
+
+    def test_sentinel_imputed(self):
+        # Verifica que el centinela -200 se impute con el valor de relleno en cualquier variable, como al entrenar
+        transform = FeatureTransform(list(ITEM), {'NOx_GT_': 0.5}, scale=[1.0] * 7, min_=[0.0] * 7,
+                                     sentinel=-200, fill_values={name: 10.0 + i for i, name in enumerate(ITEM)})
+        with TestClient(app) as client, \
+                mock.patch.object(model_holder, '_current', model_holder.current._replace(transform=transform)):
+            for name in ('NOx_GT_', 'T'):
+                missing = client.post('/predict', json=dict(ITEM, **{name: -200.0}))
+                filled = client.post('/predict', json=dict(ITEM, **{name: transform.fill_values[name]}))
+                self.assertEqual(missing.status_code, 200)
+                self.assertEqual(missing.json(), filled.json())
+
+
+class TestModelHolder(unittest.TestCase):
+    """
+    Pruebas unitarias del recambio en caliente del modelo (app/model_holder.py).
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.tmp_dir, 'model.joblib')
+        shutil.copy(os.path.join('app', 'model.joblib'), self.model_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_reload_if_changed(self):
+        # Verifica que un modelo nuevo en disco reemplace al actual
+        holder = ModelHolder(self.model_path, poll_interval=0)
+        old = holder.load()
+        self.assertFalse(holder.reload_if_changed())
+
+        new_model = RandomForestRegressor(n_estimators=2, random_state=0).fit([[0.0] * 7, [1.0] * 7], [0.0, 1.0])
+        joblib.dump(new_model, self.model_path)
+        os.utime(self.model_path, (old.mtime[0] + 10, old.mtime[0] + 10))
+
+        self.assertTrue(holder.reload_if_changed())
+        self.assertNotEqual(holder.current.version, old.version)
+        self.assertEqual(holder.current.estimator.n_estimators, 2)
+
+    def test_transform_swapped_with_model(self):
+        # Verifica que el artefacto de transformación se cargue y recargue junto al modelo
+        transform_path = os.path.join(self.tmp_dir, 'transform.json')
+        holder = ModelHolder(self.model_path, poll_interval=0, transform_path=transform_path,
+                             load_transform=FeatureTransform.load)
+        self.assertIsNone(holder.load().transform)
+
+        FeatureTransform(list(ITEM), {}, scale=[1.0] * 7, min_=[0.0] * 7).save(transform_path)
+        self.assertTrue(holder.reload_if_changed())
+        self.assertIsInstance(holder.current.transform, FeatureTransform)
+
+    def test_missing_transform(self):
+        # Verifica que la falta de transform.json se advierta, o impida la carga si es obligatoria
+        transform_path = os.path.join(self.tmp_dir, 'transform.json')
+        holder = ModelHolder(self.model_path, poll_interval=0, transform_path=transform_path,
+                             load_transform=FeatureTransform.load)
+        with self.assertLogs('MODEL_HOLDER', level='WARNING'):
+            holder.load()
+
+        required = ModelHolder(self.model_path, poll_interval=0, transform_path=transform_path,
+                               load_transform=FeatureTransform.load, require_transform=True)
+        with self.assertRaises(FileNotFoundError):
+            required.load()
+        self.assertFalse(required.loaded)
+
+    def test_compact_model(self):
+        # Verifica que un modelo compacto .npz se sirva con un cargador propio
+        compact_path = os.path.join(self.tmp_dir, 'model.npz')
+        forest = CompiledForest.from_sklearn(joblib.load(self.model_path)).compact()
+        forest.save_npz(compact_path)
+        holder = ModelHolder(compact_path, poll_interval=0, load_model=CompiledForest.load_npz)
+        estimator = holder.load().estimator
+        self.assertIsInstance(estimator, CompiledForest)
+        X = np.array([list(ITEM.values())])
+        np.testing.assert_array_equal(estimator.predict(X), forest.predict(X))
+
+    def test_listener_called_on_swap(self):
+        # Verifica que los suscriptores sean notificados en cada carga
+        holder = ModelHolder(self.model_path, poll_interval=0)
+        seen = []
+        holder.add_listener(seen.append)
+        holder.load()
+        self.assertEqual(len(seen), 1)
+
+
+class TestMicroBatcher(unittest.TestCase):
+    """
+    Pruebas unitarias del agrupamiento de peticiones concurrentes (app/batching.py).
+    """
+
+    def test_concurrent_requests_are_coalesced(self):
+        # Verifica que peticiones concurrentes se resuelvan en un único lote
+        calls = []
+
+        def predict_fn(X):
+            calls.append(X.shape[0])
+            return X.sum(axis=1)
+
+        async def scenario():
+            batcher = MicroBatcher(predict_fn, max_batch_size=16, max_wait=0.05)
+            await batcher.start()
+            results = await asyncio.gather(*[batcher.submit([float(i)] * 7) for i in range(10)])
+            await batcher.stop()
+            return results, batcher.stats()
+
+        results, stats = asyncio.run(scenario())
+        self.assertEqual(results, [7.0 * i for i in range(10)])
+        self.assertEqual(sum(calls), 10)
+        self.assertLess(len(calls), 10)
+        self.assertEqual(stats['items'], 10)
+
+    def test_bad_row_fails_alone(self):
+        # Verifica que una fila inválida en un lote solo haga fallar su propia petición
+        def predict_fn(X):
+            if (X < 0).any():
+                raise ValueError('negative feature')
+            return X.sum(axis=1)
+
+        async def scenario():
+            batcher = MicroBatcher(predict_fn, max_batch_size=16, max_wait=0.05)
+            await batcher.start()
+            results = await asyncio.gather(*[batcher.submit([float(i)] * 7) for i in range(-1, 7)],
+                                           return_exceptions=True)
+            await batcher.stop()
+            return results, batcher.stats()
+
+        results, stats = asyncio.run(scenario())
+        self.assertIsInstance(results[0], ValueError)
+        self.assertEqual(results[1:], [7.0 * i for i in range(7)])
+        self.assertLess(stats['batches'], 8)
+
+
+class TestFeedSession(unittest.TestCase):
+    """
+    Pruebas unitarias de la contrapresión por conexión WebSocket (app/feeds.py).
+    """
+
+    def test_slow_client_is_bounded_and_dropped(self):
+        # Verifica que un cliente que no lee acote la cola y termine desconectado
+        class SlowClient:
+            def __init__(self):
+                self.received = 0
+                self.closed_with = None
+
+            async def receive_text(self):
+                if self.closed_with is not None:
+                    raise RuntimeError('closed')
+                self.received += 1
+                await asyncio.sleep(0)
+                return '{}'
+
+            async def send_text(self, text):
+                await asyncio.sleep(3600)
+
+            async def close(self, code):
+                self.closed_with = code
+
+        async def handle(message):
+            return {}
+
+        async def scenario():
+            client = SlowClient()
+            session = FeedSession(client, handle, max_pending=4, send_timeout=0.05)
+            await session.run()
+            return client, session
+
+        client, session = asyncio.run(scenario())
+        self.assertEqual(client.closed_with, CLOSE_TRY_AGAIN_LATER)
+        # Un mensaje en envío, la cola llena y uno esperando lugar
+        self.assertLessEqual(session.received, 4 + 2)
+
+
+class TestAdmissionController(unittest.TestCase):
+    """
+    Pruebas unitarias del control de admisión (app/admission.py).
+    """
+
+    def test_queue_and_shed(self):
+        # Verifica que el exceso espere en la cola acotada y que el resto se rechace de inmediato
+        async def scenario():
+            admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+            await admission.acquire()
+            queued = asyncio.ensure_future(admission.acquire())
+            await asyncio.sleep(0)
+            with self.assertRaises(Overloaded):
+                await admission.acquire()
+            self.assertEqual(admission.queue_depth, 1)
+            admission.release()
+            await queued
+            timed_out = asyncio.ensure_future(admission.acquire())
+            with self.assertRaises(Overloaded):
+                await timed_out
+            return admission.stats()
+
+        stats = asyncio.run(scenario())
+        self.assertEqual(stats['in_flight'], 1)
+        self.assertEqual(stats['shed'], {'queue_full': 1, 'timeout': 1})
+
+    def test_adaptive_limit(self):
+        # Verifica que el límite baje con latencias altas y vuelva a subir con latencias bajas
+        admission = AdmissionController(max_concurrency=16, max_queue=0, min_concurrency=2,
+                                        target_latency=0.01)
+        for _ in range(50):
+            admission.in_flight += 1
+            admission._last_decrease = 0.0
+            admission.release(latency=1.0)
+        self.assertEqual(admission.effective_limit, 2)
+        for _ in range(200):
+            admission.in_flight += 1
+            admission.release(latency=0.001)
+        self.assertEqual(admission.effective_limit, 16)
+
+    def test_overloaded_response(self):
+        # Verifica que la API responda 503 con Retry-After cuando se rechaza la petición
+        max_queue, held = admission.max_queue, admission.effective_limit
+        admission.max_queue = 0
+        admission.in_flight += held
+        try:
+            with TestClient(app) as client:
+                response = client.post('/predict', json=ITEM)
+        finally:
+            admission.in_flight -= held
+            admission.max_queue = max_queue
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+
+
+class TestInferencePool(unittest.TestCase):
+    """
+    Pruebas unitarias de la inferencia en procesos con el modelo mapeado (app/workers.py).
+    """
+
+    def test_pool_matches_estimator(self):
+        # Verifica que los procesos del pool predigan lo mismo que el modelo original
+        model = joblib.load(os.path.join('app', 'model.joblib'))
+        X = np.random.default_rng(0).random((600, 7))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pool = InferencePool(2, tmp_dir)
+            engine = pool.build_engine(model)
+            self.assertEqual(pool.build_engine(model).path, engine.path)
+            pool.start()
+            try:
+                predictions = pool.predict(engine, X)
+            finally:
+                pool.stop()
+        np.testing.assert_allclose(predictions, CompiledForest.from_sklearn(model).predict(X))
+
+
+class TestPredictionCache(unittest.TestCase):
+    """
+    Pruebas unitarias de la caché de predicciones (app/prediction_cache.py).
+    """
+
+    def test_lru_eviction(self):
+        # Verifica que se descarte la entrada usada hace más tiempo
+        cache = PredictionCache(max_size=2)
+        cache.put([1.0], 1.0)
+        cache.put([2.0], 2.0)
+        cache.get([1.0])
+        cache.put([3.0], 3.0)
+        self.assertIsNone(cache.get([2.0]))
+        self.assertEqual(cache.get([1.0]), 1.0)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl_expiry(self):
+        # Verifica que las entradas caduquen pasado el TTL
+        cache = PredictionCache(ttl=-1)
+        cache.put([1.0], 1.0)
+        self.assertIsNone(cache.get([1.0]))
+
+    def test_rounding_and_counters(self):
+        # Verifica que lecturas casi idénticas compartan entrada y se cuenten aciertos y fallos
+        cache = PredictionCache(decimals=1)
+        self.assertIsNone(cache.get([1.04]))
+        cache.put([1.04], 5.0)
+        self.assertEqual(cache.get([0.98]), 5.0)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 1))
+
+    def test_cleared_on_model_swap(self):
+        # Verifica que al cambiar de modelo se vacíe la caché y se ignoren valores viejos
+        holder = ModelHolder(os.path.join('app', 'model.joblib'), poll_interval=0)
+        cache = PredictionCache()
+        holder.add_listener(cache.clear)
+        cache.put([1.0], 1.0)
+        generation = cache.generation
+        holder.load()
+        self.assertEqual(len(cache), 0)
+        cache.put([1.0], 1.0, generation)
+        self.assertIsNone(cache.get([1.0]))
+
+
+class TestModelRegistry(unittest.TestCase):
+    """
+    Pruebas unitarias del registro de versiones del modelo (app/model_registry.py).
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = {}
+        for name, n_estimators in [('small', 2), ('large', 20)]:
+            model = RandomForestRegressor(n_estimators=n_estimators, random_state=0).fit(
+                np.random.default_rng(0).random((200, 7)), np.arange(200.0))
+            self.paths[name] = os.path.join(self.tmp_dir, f'{name}.joblib')
+            joblib.dump(model, self.paths[name])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parse_versions(self):
+        # Verifica el formato name=path[:weight] de MODEL_VERSIONS
+        self.assertEqual(parse_versions('a=models/a.joblib:0.1, b=/tmp/b.npz'),
+                         [('a', 'models/a.joblib', 0.1), ('b', '/tmp/b.npz', 0.0)])
+        with self.assertRaises(ValueError):
+            parse_versions('models/a.joblib')
+
+    def test_lazy_load_and_lru_eviction(self):
+        # Verifica la carga diferida y el desalojo LRU al superar el presupuesto de memoria
+        registry = ModelRegistry(memory_budget=1)
+        for name, path in self.paths.items():
+            registry.add(name, ModelHolder(path, poll_interval=0))
+        self.assertFalse(registry.is_loaded('small'))
+
+        registry.get('small')
+        self.assertTrue(registry.is_loaded('small'))
+        registry.get('large')
+        self.assertFalse(registry.is_loaded('small'))
+        self.assertTrue(registry.is_loaded('large'))
+        self.assertEqual(registry.evictions, 1)
+
+        registry.memory_budget = 1 << 30
+        registry.get('small')
+        self.assertTrue(registry.is_loaded('large'))
+
+    def test_load_does_not_block_loaded_versions(self):
+        # Verifica que la carga lenta de una versión no bloquee el acceso a las ya cargadas
+        release = threading.Event()
+
+        def slow_load(path):
+            release.wait(5)
+            return joblib.load(path)
+
+        registry = ModelRegistry(memory_budget=1 << 30)
+        registry.add('small', ModelHolder(self.paths['small'], poll_interval=0))
+        registry.add('slow', ModelHolder(self.paths['large'], poll_interval=0, load_model=slow_load))
+        registry.get('small')
+        loader = threading.Thread(target=registry.get, args=('slow',))
+        loader.start()
+        try:
+            started = time.perf_counter()
+            self.assertIsNotNone(registry.peek('small'))
+            registry.get('small')
+            self.assertLess(time.perf_counter() - started, 1)
+            self.assertIsNone(registry.peek('slow'))
+        finally:
+            release.set()
+            loader.join()
+        self.assertIsNotNone(registry.peek('slow'))
+
+    def test_weighted_choice(self):
+        # Verifica que el reparto siga los pesos y que el encabezado lo anule
+        registry = ModelRegistry(memory_budget=1 << 30)
+        registry.add('a', ModelHolder(self.paths['small'], poll_interval=0), weight=1)
+        registry.add('b', ModelHolder(self.paths['large'], poll_interval=0), weight=3)
+        registry.add('c', ModelHolder(self.paths['large'], poll_interval=0))
+        choices = [registry.choose() for _ in range(2000)]
+        self.assertNotIn('c', choices)
+        self.assertAlmostEqual(choices.count('b') / len(choices), 0.75, delta=0.05)
+        self.assertEqual(registry.choose('c'), 'c')
+        with self.assertRaises(KeyError):
+            registry.choose('missing')
+
+    def test_route_by_header(self):
+        # Verifica el ruteo por encabezado en la API y las métricas por versión
+        model_registry.add('canary', ModelHolder(self.paths['small'], poll_interval=0))
+        try:
+            with TestClient(app) as client:
+                main = client.post('/predict', json=ITEM)
+                canary = client.post('/predict', json=ITEM, headers={'x-model-version': 'canary'})
+                unknown = client.post('/predict', json=ITEM, headers={'x-model-version': 'missing'})
+                stats = client.get('/models').json()
+                metrics = client.get('/metrics').text
+        finally:
+            model_registry.remove('canary')
+
+        expected = joblib.load(self.paths['small']).predict(np.array([list(ITEM.values())]))[0]
+        self.assertEqual(canary.headers['x-model-version'], 'canary')
+        self.assertNotEqual(main.headers['x-model-version'], 'canary')
+        self.assertAlmostEqual(canary.json()['CO(GT)'], expected)
+        self.assertEqual(unknown.status_code, 404)
+        self.assertTrue(stats['versions']['canary']['loaded'])
+        self.assertIn('model_version_predictions_total{version="canary"} 1.0', metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,12 @@
 import unittest
+import filecmp
+import json
+import os
+import tempfile
+import numpy as np
 import pandas as pd
 import yaml
-from src.stages.data_load import data_load
+from src.stages.data_load import data_load, data_load_chunked
 
 class TestDataLoad(unittest.TestCase):
 
@@ -32,6 +37,117 @@ class TestDataLoad(unittest.TestCase):
         df = pd.read_csv(self.config['data_load']['dataset_csv_cleaned'])
         # Se verifica que el número de filas en el DataFrame sea igual a 9357.
         self.assertEqual(len(df), 9357, "Unexpected number of rows in the cleaned dataset")
+
+    def test_chunked_output_identical(self):
+        # Prueba para verificar que el modo por bloques genere exactamente el mismo archivo.
+        data_load('params.yaml')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = dict(self.config, data_load=dict(
+                self.config['data_load'], chunksize=500,
+                dataset_csv_cleaned=os.path.join(tmp_dir, 'cleaned.csv')))
+            config_path = os.path.join(tmp_dir, 'params.yaml')
+            with open(config_path, 'w') as f:
+                yaml.safe_dump(config, f)
+            data_load(config_path)
+            self.assertTrue(filecmp.cmp(self.config['data_load']['dataset_csv_cleaned'],
+                                        config['data_load']['dataset_csv_cleaned'], shallow=False))
+
+    def test_chunked_binary_storage_refused(self):
+        # Prueba para verificar que el modo por bloques rechace formatos binarios, que no admiten añadir filas.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(ValueError):
+                data_load_chunked(self.config['data_load']['dataset_csv'], os.path.join(tmp_dir, 'cleaned.csv'),
+                                  500, storage={'format': 'npz'})
+            self.assertEqual(os.listdir(tmp_dir), [])
+
+    def test_typed_projection(self):
+        # Prueba para verificar la lectura de columnas seleccionadas, en float32 y con fecha y hora unidas.
+        data_load('params.yaml')
+        expected = pd.read_csv(self.config['data_load']['dataset_csv_cleaned'])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = dict(self.config, data_load=dict(
+                self.config['data_load'], usecols=['CO_GT_', 'T'], sensor_dtype='float32',
+                parse_datetime=True, dataset_csv_cleaned=os.path.join(tmp_dir, 'cleaned.csv')))
+            config_path = os.path.join(tmp_dir, 'params.yaml')
+            with open(config_path, 'w') as f:
+                yaml.safe_dump(config, f)
+            data_load(config_path)
+            df = pd.read_csv(config['data_load']['dataset_csv_cleaned'], parse_dates=['Datetime'])
+
+        self.assertListEqual(list(df.columns), ['Datetime', 'CO_GT_', 'T'])
+        self.assertEqual(len(df), len(expected))
+        self.assertEqual(df['Datetime'].iloc[0], pd.Timestamp('2004-03-10 18:00:00'))
+        # Los valores en float32 coinciden con los originales a su precisión
+        np.testing.assert_allclose(df['CO_GT_'], expected['CO_GT_'], rtol=1e-6)
+
+    def test_multiple_stations(self):
+        # Prueba para verificar la carga en paralelo de varias estaciones, unidas y ordenadas en el tiempo.
+        raw = pd.read_csv(self.config['data_load']['dataset_csv'], sep=';', dtype=str, nrows=300)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Dos estaciones con lecturas desfasadas que se intercalan en el tiempo
+            os.mkdir(os.path.join(tmp_dir, 'stations'))
+            raw.iloc[:200].to_csv(os.path.join(tmp_dir, 'stations', 'north.csv'), sep=';', index=False)
+            raw.iloc[100:].to_csv(os.path.join(tmp_dir, 'stations', 'south.csv'), sep=';', index=False)
+            config = dict(self.config, data_load=dict(
+                self.config['data_load'], dataset_csv=os.path.join(tmp_dir, 'stations', '*.csv'), workers=2,
+                parse_datetime=True, dataset_csv_cleaned=os.path.join(tmp_dir, 'cleaned.csv')))
+            config_path = os.path.join(tmp_dir, 'params.yaml')
+            with open(config_path, 'w') as f:
+                yaml.safe_dump(config, f)
+            data_load(config_path)
+            df = pd.read_csv(config['data_load']['dataset_csv_cleaned'], parse_dates=['Datetime'])
+
+        self.assertListEqual(list(df.columns[:2]), ['Datetime', 'Station'])
+        self.assertEqual(df['Station'].value_counts().to_dict(), {'north': 200, 'south': 200})
+        # Orden por fecha y hora, y por estación dentro de la misma hora
+        sorted_df = df.sort_values(['Datetime', 'Station'])
+        self.assertTrue(df.index.equals(sorted_df.index))
+
+    def test_incremental(self):
+        # Prueba para verificar que agregar lecturas en varias ejecuciones da el mismo archivo que una carga completa.
+        data_load('params.yaml')
+        with open(self.config['data_load']['dataset_csv'], 'rb') as f:
+            lines = f.readlines()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            raw_path = os.path.join(tmp_dir, 'raw.csv')
+            config = dict(self.config, data_load=dict(
+                self.config['data_load'], dataset_csv=raw_path, incremental=True,
+                dataset_csv_cleaned=os.path.join(tmp_dir, 'cleaned.csv')))
+            config_path = os.path.join(tmp_dir, 'params.yaml')
+            with open(config_path, 'w') as f:
+                yaml.safe_dump(config, f)
+            watermark_path = os.path.join(tmp_dir, 'cleaned.watermark.json')
+
+            # Primera ejecución (carga completa) y luego dos tandas de lecturas nuevas,
+            # las dos primeras ejecuciones terminadas a mitad de una línea
+            with open(raw_path, 'wb') as f:
+                f.writelines(lines[:5000])
+                f.write(lines[5000][:10])
+            data_load(config_path)
+            with open(watermark_path) as f:
+                watermark = json.load(f)
+            # La carga completa no procesa la línea a medio escribir
+            self.assertEqual(watermark['offset'], sum(len(line) for line in lines[:5000]))
+            self.assertEqual(watermark['rows'], 4999)
+            with open(raw_path, 'ab') as f:
+                f.write(lines[5000][10:])
+                f.writelines(lines[5001:8000])
+                f.write(lines[8000][:10])
+            data_load(config_path)
+            with open(watermark_path) as f:
+                watermark = json.load(f)
+            self.assertEqual(watermark['rows'], 7999)
+            with open(raw_path, 'ab') as f:
+                f.write(lines[8000][10:])
+                f.writelines(lines[8001:])
+            data_load(config_path)
+
+            self.assertTrue(filecmp.cmp(self.config['data_load']['dataset_csv_cleaned'],
+                                        config['data_load']['dataset_csv_cleaned'], shallow=False))
+            with open(watermark_path) as f:
+                watermark = json.load(f)
+            self.assertEqual(watermark['offset'], sum(len(line) for line in lines))
+            self.assertEqual(watermark['last_datetime'], '2005-04-04T14:00:00')
         
 
 if __name__ == '__main__':
@@ -3,7 +3,11 @@ import pandas as pd
 import yaml
 import os
 
+import numpy as np
+from scipy.special import inv_boxcox
+
 from src.stages.data_split import data_split
+from src.utils.transforms import FeatureTransform
 
 
 class TestDataSplit(unittest.TestCase):
@@ -47,6 +51,18 @@ class TestDataSplit(unittest.TestCase):
         self.assertEqual(y_train.index.tolist(), list(range(y_train.shape[0])))
         self.assertEqual(y_test.index.tolist(), list(range(y_test.shape[0])))
 
+    def test_transform_artifact(self):
+        # Verifica que el artefacto de transformación reproduzca las características escaladas
+        data_split('params.yaml')
+        transform = FeatureTransform.load(self.config['data_split']['transform_path'])
+        X_train = pd.read_csv(self.config['data_split']['X_train_csv_path'])
+        X_train_scaled = pd.read_csv(self.config['data_split']['X_train_scaled_csv_path'])
+        # Se deshace Box-Cox para volver a los valores crudos que recibe la API
+        X_raw = X_train.copy()
+        for column, lmbda in transform.boxcox_lambdas.items():
+            X_raw[column] = inv_boxcox(X_train[column], lmbda)
+        np.testing.assert_allclose(transform.transform(X_raw[transform.features]), X_train_scaled[transform.features], atol=1e-9)
+
     def test_data_split_train_size(self):
         # Verifica que el tamaño del conjunto de prueba sea correcto
         X = pd.read_csv(self.config['featurize']['X_scaled_csv_path'])
@@ -56,6 +72,20 @@ class TestDataSplit(unittest.TestCase):
         X_train = pd.read_csv(self.config['data_split']['X_train_csv_path'])
         self.assertEqual(X_train.shape[0], expected_train_size)
 
+    def test_data_split_matrices(self):
+        # Verifica que las matrices .npy contengan los mismos conjuntos que las tablas
+        data_split('params.yaml')
+        storage = self.config['storage']
+        for key in ('X_train_scaled_csv_path', 'X_test_scaled_csv_path', 'y_train_csv_path', 'y_test_csv_path'):
+            path = self.config['data_split'][key]
+            matrix = np.load(os.path.splitext(path)[0] + '.npy', mmap_mode='r')
+            table = pd.read_csv(path)
+            self.assertEqual(matrix.shape, table.shape)
+            np.testing.assert_allclose(matrix, table.to_numpy(), rtol=1e-6 if key.startswith('X') else 1e-12)
+        self.assertEqual(np.load(os.path.splitext(self.config['data_split']['X_train_scaled_csv_path'])[0] + '.npy',
+                                 mmap_mode='r').dtype, np.dtype(storage['matrix_dtype']))
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,40 @@
+import unittest
+import json
+import yaml
+
+import numpy as np
+import pandas as pd
+
+from src.stages.export import export
+from src.utils.forest import CompiledForest
+
+
+class TestExport(unittest.TestCase):
+    """
+    Pruebas unitarias de la etapa de exportación del modelo compacto (export.py).
+    """
+
+    def setUp(self):
+        # Se carga el archivo de configuración params.yaml
+        with open('params.yaml') as f:
+            self.config = yaml.safe_load(f)
+
+    def test_export(self):
+        # Verifica que el artefacto sea más pequeño y respete el margen de error configurado
+        export('params.yaml')
+        with open(self.config['export']['report_path']) as json_file:
+            report = json.load(json_file)
+
+        self.assertLess(report['compact']['size_bytes'], report['original']['size_bytes'])
+        # La profundidad se elige con el error out-of-bag del entrenamiento, no con el conjunto de prueba
+        self.assertLessEqual(report['pruning']['oob_rmse_increase'],
+                             self.config['export']['max_error_increase'] + 1e-9)
+
+        compact = CompiledForest.load_npz(self.config['export']['model_path'])
+        self.assertEqual(compact.threshold.dtype, np.float32)
+        X_test = pd.read_csv(self.config['data_split']['X_test_scaled_csv_path']).to_numpy()
+        self.assertEqual(compact.predict(X_test).shape, (X_test.shape[0],))
+
+
+if __name__ == '__main__':
+    unittest.main()
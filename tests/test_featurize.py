@@ -3,7 +3,10 @@ import pandas as pd
 import numpy as np
 import yaml
 
-from src.stages.featurize import featurize
+import os
+import tempfile
+
+from src.stages.featurize import Featurizer, featurize, outlier_bounds, outlier_mask, remove_outliers
 
 class TestFeaturize(unittest.TestCase):
 
@@ -49,5 +52,88 @@ class TestFeaturize(unittest.TestCase):
                 skewness_after = X[column].skew()
                 self.assertTrue(abs(skewness_after) < 1.25, f"Skewness after Box-Cox transformation is still high for column {column}")
 
+    def test_outliers_vectorized(self):
+        # Verifica que el modo vectorizado use límites de todas las filas y una sola máscara combinada
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(rng.standard_normal((2000, 3)) * [1, 10, 100], columns=['a', 'b', 'c'])
+        df.iloc[::97, 1] = 500.0
+        df.iloc[5, 2] = np.nan
+        df['label'] = 'x'
+
+        numeric = df[['a', 'b', 'c']]
+        lower, upper = numeric.mean() - 4 * numeric.std(), numeric.mean() + 4 * numeric.std()
+        expected = df[((numeric > lower) & (numeric < upper)).all(axis=1)]
+        pd.testing.assert_frame_equal(remove_outliers(df, 'vectorized'), expected)
+
+        # El resultado no depende del orden de las columnas
+        reordered = remove_outliers(df[['c', 'label', 'b', 'a']], 'vectorized')
+        pd.testing.assert_frame_equal(reordered[df.columns], expected)
+
+        # Límites y máscara por separado, como en la función
+        columns = [df[column].to_numpy() for column in ['a', 'b', 'c']]
+        np.testing.assert_allclose(outlier_bounds(columns)[0], lower.to_numpy())
+        self.assertEqual(outlier_mask(columns, *outlier_bounds(columns)).sum(), len(expected))
+
+    def test_outliers_sequential(self):
+        # Verifica que el modo secuencial conserve el comportamiento original columna por columna
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame(rng.standard_t(3, (3000, 3)), columns=['a', 'b', 'c'])
+        expected = df
+        for column in df.columns:
+            mean, std = expected[column].mean(), expected[column].std()
+            expected = expected[(expected[column] > mean - 4 * std) & (expected[column] < mean + 4 * std)]
+        pd.testing.assert_frame_equal(remove_outliers(df, 'sequential'), expected)
+        with self.assertRaises(ValueError):
+            remove_outliers(df, 'unknown')
+
+    def cleaned_data(self):
+        # Datos limpios sin las columnas descartadas, como los recibe el Featurizer en featurize
+        df = pd.read_csv(self.config['data_load']['dataset_csv_cleaned'])
+        return df.drop(columns=[col for col in self.config['featurize']['cols_to_drop'] if col in df.columns])
+
+    def test_featurizer_matches_stage(self):
+        # Verifica que el Featurizer guardado por la etapa reproduzca X e y sin reajustarse
+        featurize('params.yaml')
+        featurizer = Featurizer.load(self.config['featurize']['featurizer_path'])
+        X, y = featurizer.transform(self.cleaned_data())
+        pd.testing.assert_frame_equal(X.reset_index(drop=True), pd.read_csv(self.config['featurize']['X_scaled_csv_path']))
+        pd.testing.assert_series_equal(y.reset_index(drop=True), pd.read_csv(self.config['featurize']['y_csv_path'])['CO_GT_'])
+
+    def test_featurizer_sequential_mask(self):
+        # Las bandas aprendidas en modo secuencial, aplicadas como una sola máscara, dan el resultado secuencial
+        df = self.cleaned_data()
+        featurizer = Featurizer.fit(df, outlier_mode='sequential')
+        X, _ = featurizer.transform(df)
+
+        imputed = df.replace(to_replace=-200, value=np.nan)
+        imputed = imputed.fillna(imputed.mean())
+        expected = imputed
+        for column in expected.columns:
+            mean, std = expected[column].mean(), expected[column].std()
+            expected = expected[(expected[column] > mean - 4 * std) & (expected[column] < mean + 4 * std)]
+        self.assertTrue(X.index.equals(expected.index))
+
+    def test_featurizer_batches(self):
+        # Un lote nuevo se transforma fila por fila igual que el conjunto completo, también tras guardar y cargar
+        df = self.cleaned_data()
+        featurizer = Featurizer.fit(df)
+        X, y = featurizer.transform(df)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'featurizer.json')
+            featurizer.save(path)
+            loaded = Featurizer.load(path)
+
+        batch = df.iloc[1000:1100]
+        X_batch, y_batch = loaded.transform(batch)
+        pd.testing.assert_frame_equal(X_batch, X.loc[X.index.intersection(batch.index)])
+        pd.testing.assert_series_equal(y_batch, y.loc[X_batch.index])
+
+        # Sin la variable objetivo (al servir) y sin descartar filas
+        X_serving, y_serving = loaded.transform(batch.drop(columns=['CO_GT_']), drop_outliers=False)
+        self.assertIsNone(y_serving)
+        self.assertEqual(len(X_serving), len(batch))
+        self.assertListEqual(list(X_serving.columns), featurizer.features)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import unittest
+import tempfile
+import warnings
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from src.utils.forest import CompiledForest
+
+
+class TestCompiledForest(unittest.TestCase):
+    """
+    Pruebas unitarias del motor de inferencia compilado (src/utils/forest.py).
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.X = rng.random((500, 7))
+        self.y = self.X @ rng.random(7) + rng.normal(0, 0.1, 500)
+
+    def test_matches_random_forest(self):
+        # Verifica que las predicciones coincidan con sklearn
+        model = RandomForestRegressor(n_estimators=10, max_depth=8, random_state=42).fit(self.X, self.y)
+        compiled = CompiledForest.from_sklearn(model)
+        np.testing.assert_allclose(compiled.predict(self.X), model.predict(self.X), rtol=1e-12)
+
+    def test_matches_decision_tree(self):
+        # Verifica que un árbol individual también se pueda compilar
+        model = DecisionTreeRegressor(max_depth=5, random_state=42).fit(self.X, self.y)
+        compiled = CompiledForest.from_sklearn(model)
+        np.testing.assert_allclose(compiled.predict(self.X), model.predict(self.X), rtol=1e-12)
+
+    def test_matches_serving_model(self):
+        # Verifica la equivalencia con el modelo servido por la API, por lotes de distinto tamaño
+        model = joblib.load('app/model.joblib')
+        compiled = CompiledForest.from_sklearn(model)
+        X = np.random.default_rng(0).random((3000, 7))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            expected = model.predict(X)
+        np.testing.assert_allclose(compiled.predict(X), expected, rtol=1e-12)
+        np.testing.assert_allclose(compiled.predict(X[:1]), expected[:1], rtol=1e-12)
+
+    def test_save_and_mmap_load(self):
+        # Verifica que las tablas guardadas se puedan mapear en memoria con el mismo resultado
+        model = RandomForestRegressor(n_estimators=5, max_depth=6, random_state=42).fit(self.X, self.y)
+        compiled = CompiledForest.from_sklearn(model)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            compiled.save(tmp_dir)
+            mapped = CompiledForest.load(tmp_dir, mmap_mode='r')
+            self.assertIsInstance(mapped.threshold, np.memmap)
+            self.assertEqual(mapped.touch_pages(), mapped.nbytes)
+            self.assertEqual(compiled.touch_pages(), 0)
+            self.assertEqual(mapped.digest(), compiled.digest())
+            np.testing.assert_array_equal(mapped.predict(self.X), compiled.predict(self.X))
+
+    def test_compact_float32(self):
+        # Verifica que los umbrales float32 redondeados hacia abajo no cambien el recorrido
+        model = RandomForestRegressor(n_estimators=10, max_depth=8, random_state=42).fit(self.X, self.y)
+        compiled = CompiledForest.from_sklearn(model)
+        compact = compiled.compact()
+        self.assertEqual(compact.threshold.dtype, np.float32)
+        self.assertEqual(compact.children.dtype, np.int32)
+        self.assertTrue((compact.threshold.astype(np.float64) <= compiled.threshold).all())
+        # Valores de entrada iguales a los umbrales: el caso límite de la comparación
+        internal = (compiled.children[:, 0] != np.arange(compiled.n_nodes)) & (compiled.feature == 0)
+        X = self.X[:50].copy()
+        X[:, 0] = np.resize(compiled.threshold[internal].astype(np.float32), 50)
+        np.testing.assert_allclose(compact.predict(X), compiled.predict(X), rtol=1e-6)
+        np.testing.assert_allclose(compact.predict(self.X), model.predict(self.X), rtol=1e-6)
+
+    def test_prune(self):
+        # Verifica que la poda prediga el valor del nodo en la profundidad de corte
+        model = DecisionTreeRegressor(max_depth=8, random_state=42).fit(self.X, self.y)
+        compiled = CompiledForest.from_sklearn(model)
+        pruned = compiled.prune(3)
+        tree = model.tree_
+        depth = compiled.node_depths()
+        path = model.decision_path(self.X).toarray().astype(bool)
+        expected = [tree.value[np.flatnonzero(row & (depth <= 3))[-1], 0, 0] for row in path]
+        self.assertEqual(pruned.max_depth, 3)
+        self.assertLess(pruned.n_nodes, compiled.n_nodes)
+        np.testing.assert_allclose(pruned.predict(self.X), expected, rtol=1e-12)
+        np.testing.assert_array_equal(compiled.prune(8).predict(self.X), compiled.predict(self.X))
+
+    def test_save_npz(self):
+        # Verifica que el artefacto compacto en un solo archivo conserve las predicciones
+        model = RandomForestRegressor(n_estimators=5, max_depth=6, random_state=42).fit(self.X, self.y)
+        compact = CompiledForest.from_sklearn(model).compact().prune(4)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = f'{tmp_dir}/model.npz'
+            compact.save_npz(path)
+            loaded = CompiledForest.load_npz(path)
+        self.assertEqual(loaded.digest(), compact.digest())
+        np.testing.assert_array_equal(loaded.predict(self.X), compact.predict(self.X))
+
+    def test_wrong_shape(self):
+        # Verifica que se rechacen matrices con un número distinto de características
+        model = DecisionTreeRegressor(max_depth=3).fit(self.X, self.y)
+        with self.assertRaises(ValueError):
+            CompiledForest.from_sklearn(model).predict(self.X[:, :3])
+
+    def test_non_finite_input(self):
+        # Verifica que se rechacen NaN, infinitos y valores fuera del rango de float32, como sklearn
+        forest = CompiledForest.from_sklearn(DecisionTreeRegressor(max_depth=3).fit(self.X, self.y))
+        for value in (np.nan, np.inf, 1e300):
+            X = self.X[:2].astype(np.float64)
+            X[1, 0] = value
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                forest.predict(X)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import importlib.util
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from src.utils import storage
+from src.utils.storage import (load_matrix, read_table, storage_format, table_path, write_matrix,
+                               write_table)
+
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+class TestStorage(unittest.TestCase):
+    """
+    Pruebas unitarias de la capa de almacenamiento de tablas intermedias (storage.py).
+    """
+
+    def setUp(self):
+        # Tabla con columnas numéricas, de texto y valores faltantes en ambas
+        self.df = pd.DataFrame({
+            'Date': ['10/03/2004', np.nan, '11/03/2004'],
+            'CO_GT_': [2.6, np.nan, -200.0],
+            'count': np.array([1, 2, 3], dtype=np.int64),
+        })
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'table.csv')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_table_path(self):
+        # La extensión configurada se reemplaza por la del formato
+        self.assertEqual(table_path('data/X.csv', None), 'data/X.csv')
+        self.assertEqual(table_path('data/X.csv', {'format': 'npz'}), 'data/X.npz')
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            storage_format({'format': 'xlsx'})
+
+    def test_csv_round_trip(self):
+        # El formato csv por defecto escribe lo mismo que DataFrame.to_csv
+        written = write_table(self.df, self.path)
+        self.assertEqual(written, self.path)
+        pd.testing.assert_frame_equal(read_table(self.path), pd.read_csv(self.path))
+
+    def test_npz_round_trip(self):
+        # npz conserva tipos, orden de columnas y valores faltantes de texto
+        config = {'format': 'npz', 'compression': None}
+        written = write_table(self.df, self.path, config)
+        self.assertTrue(written.endswith('.npz'))
+        pd.testing.assert_frame_equal(read_table(self.path, config), self.df)
+
+        # Lectura de un subconjunto de columnas en el orden pedido
+        subset = read_table(self.path, config, columns=['count', 'CO_GT_'])
+        pd.testing.assert_frame_equal(subset, self.df[['count', 'CO_GT_']])
+
+    def test_npz_compressed_and_export_csv(self):
+        config = {'format': 'npz', 'compression': 'zip', 'export_csv': True}
+        write_table(self.df, self.path, config)
+        pd.testing.assert_frame_equal(read_table(self.path, config), self.df)
+        # Copia csv legible junto a la tabla binaria
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_parquet_fallback(self):
+        # Sin pyarrow, parquet se almacena como npz
+        with mock.patch.object(storage, '_has_pyarrow', return_value=False):
+            self.assertEqual(storage_format({'format': 'parquet'}), 'npz')
+            written = write_table(self.df, self.path, {'format': 'parquet'})
+            self.assertTrue(written.endswith('.npz'))
+            pd.testing.assert_frame_equal(read_table(self.path, {'format': 'parquet'}), self.df)
+
+    def test_matrix_memory_mapped(self):
+        # Las matrices .npy se abren mapeadas en memoria, de solo lectura, con el tipo pedido
+        numeric = self.df[['CO_GT_', 'count']]
+        self.assertTrue(write_matrix(numeric, self.path, np.float32).endswith('.npy'))
+        matrix = load_matrix(self.path, {'matrices': True})
+        self.assertIsInstance(matrix, np.memmap)
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertFalse(matrix.flags.writeable)
+        np.testing.assert_array_equal(matrix, numeric.to_numpy(dtype=np.float32))
+
+        # Sin matrices se lee la tabla
+        write_table(numeric, self.path)
+        self.assertIsInstance(load_matrix(self.path), pd.DataFrame)
+
+    @unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_parquet_feather_round_trip(self):
+        for fmt in ('parquet', 'feather'):
+            with self.subTest(fmt=fmt):
+                config = {'format': fmt}
+                self.assertTrue(write_table(self.df, self.path, config).endswith(f'.{fmt}'))
+                pd.testing.assert_frame_equal(read_table(self.path, config), self.df)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+from scipy import stats
+from sklearn.preprocessing import MinMaxScaler
+
+from src.utils.transforms import FeatureTransform
+
+
+class TestFeatureTransform(unittest.TestCase):
+    """
+    Pruebas unitarias del kernel fusionado Box-Cox + MinMax (src/utils/transforms.py).
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.features = ['a', 'b', 'c']
+        self.X = np.column_stack([rng.lognormal(3, 1, 200), rng.lognormal(1, 0.5, 200), rng.normal(0, 1, 200)])
+
+    def test_matches_scipy_and_sklearn(self):
+        # Verifica que el kernel fusionado reproduzca boxcox + MinMaxScaler
+        X_boxcox = self.X.copy()
+        X_boxcox[:, 0], lambda_a = stats.boxcox(self.X[:, 0])
+        X_boxcox[:, 1] = stats.boxcox(self.X[:, 1], lmbda=0)
+        scaler = MinMaxScaler().fit(X_boxcox)
+
+        transform = FeatureTransform.fit(self.features, {'a': lambda_a, 'b': 0.0}, scaler)
+        np.testing.assert_allclose(transform.transform(self.X), scaler.transform(X_boxcox), atol=1e-12)
+
+    def test_save_and_load(self):
+        # Verifica que el artefacto JSON conserve la transformación
+        scaler = MinMaxScaler().fit(self.X)
+        transform = FeatureTransform.fit(self.features, {}, scaler)
+        restored = FeatureTransform.from_dict(transform.to_dict())
+        np.testing.assert_allclose(restored.transform(self.X), scaler.transform(self.X), atol=1e-12)
+
+    def test_non_positive_boxcox_input(self):
+        # Verifica que se rechacen valores no positivos en columnas con Box-Cox
+        transform = FeatureTransform(self.features, {'c': 0.5}, scale=[1, 1, 1], min_=[0, 0, 0])
+        with self.assertRaises(ValueError):
+            transform.transform(self.X)
+
+    def test_sentinel_imputed(self):
+        # Verifica que el centinela se reemplace por el valor de relleno de cada columna, también con Box-Cox
+        fill_values = {'a': 5.0, 'b': 2.0, 'c': 0.5}
+        transform = FeatureTransform(self.features, {'a': 0.5}, scale=[1, 1, 1], min_=[0, 0, 0],
+                                     sentinel=-200, fill_values=fill_values)
+        X = self.X[:3].copy()
+        X[0, 0] = X[1, 2] = -200
+        expected = X.copy()
+        expected[0, 0], expected[1, 2] = fill_values['a'], fill_values['c']
+        self.assertFalse(transform.invalid_rows(X).any())
+        np.testing.assert_allclose(transform.transform(X), transform.transform(expected))
+        # Sin valor de relleno para cada columna el centinela no se podría imputar
+        with self.assertRaises(ValueError):
+            FeatureTransform(self.features, {}, scale=[1, 1, 1], min_=[0, 0, 0], sentinel=-200,
+                             fill_values={'a': 5.0})
+
+
+if __name__ == '__main__':
+    unittest.main()